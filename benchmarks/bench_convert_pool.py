@@ -0,0 +1,106 @@
+"""Benchmark ingest throughput against the size of the conversion pool.
+
+Writes the same batches of dict rows through `DuckDBSinkPartition` once
+per `convert_workers` setting, each into a fresh database, and reports
+rows/s relative to converting on the calling thread. Like the `output`
+operator, every `write_batch` call gets a single batch, and the final
+snapshot that inserts the last one is timed too.
+
+With the GIL, chunks cannot convert in parallel, so the only gain is
+each batch converting while DuckDB, which releases the GIL, inserts the
+one from the previous call; it is at most the shorter of the two
+phases, and nothing on a single CPU. On a free-threaded build chunks convert in parallel
+too, up to the number of CPUs.
+
+Run with:
+
+```console
+$ python benchmarks/bench_convert_pool.py --rows 2000000 --workers 0,1,2,4,8
+```
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+os.environ.setdefault("BYTEWAX_LICENSE", "1")
+
+from bytewax.duckdb import DuckDBSinkPartition  # noqa: E402
+
+CREATE_TABLE_SQL = (
+    "CREATE TABLE events ("
+    "ts TIMESTAMP WITH TIME ZONE, tenant INTEGER, kind TEXT, value DOUBLE)"
+)
+
+
+def _batches(rows: int, batch_size: int, seed: int) -> List[List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    events = [
+        {
+            "ts": start + timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+            "tenant": rng.randrange(1_000),
+            "kind": rng.choice(("click", "view", "purchase")),
+            "value": rng.random(),
+        }
+        for _ in range(rows)
+    ]
+    return [events[i : i + batch_size] for i in range(0, rows, batch_size)]
+
+
+def _ingest(
+    db_path: Path, batches: List[List[Dict[str, Any]]], convert_workers: int
+) -> float:
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        CREATE_TABLE_SQL,
+        None,
+        convert_workers=convert_workers,
+    )
+    start = time.perf_counter()
+    for batch in batches:
+        part.write_batch([batch])
+    part.snapshot()
+    elapsed = time.perf_counter() - start
+    part.close()
+    return elapsed
+
+
+def main() -> None:
+    """Run the benchmark and print rows/s per pool size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        default="0,1,2,4",
+        help="comma separated pool sizes to compare (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    batches = _batches(args.rows, args.batch_size, args.seed)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(
+        f"{args.rows:,} rows in batches of {args.batch_size:,}, "
+        f"{os.cpu_count()} CPUs, GIL {'enabled' if gil else 'disabled'}"
+    )
+
+    base = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (int(w) for w in args.workers.split(",")):
+            elapsed = _ingest(Path(tmp) / f"workers_{workers}.duckdb", batches, workers)
+            rate = args.rows / elapsed
+            base = base or rate
+            print(f"{workers:>3} workers: {rate:>12,.0f} rows/s  {rate / base:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
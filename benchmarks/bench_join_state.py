@@ -0,0 +1,115 @@
+"""Benchmark the per-batch cost of `join` against the size of its state.
+
+Fills one shard of the join's logic with values for a fixed set of keys,
+in large batches, then times small batches of values arriving on top of
+that state. Each state size is run with the state in a single table as
+before it was partitioned, in key partitions, and in key partitions with
+a `ttl` shorter than the time it takes to fill them.
+
+With a single table, every batch probes all state, so its cost grows
+linearly with the number of values kept. Partitioned, a batch of `b`
+keys only reads the recent values and about `1 - (1 - 1/64) ** b` of
+the settled ones, which saves the most for small batches and nothing
+once batches cover every partition. A `ttl` bounds the state itself.
+
+Run with:
+
+```console
+$ python benchmarks/bench_join_state.py --states 0,500000,2000000 --batches 100
+```
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+os.environ.setdefault("BYTEWAX_LICENSE", "1")
+
+from bytewax.duckdb import state  # noqa: E402
+from bytewax.duckdb.state import _LEFT, _RIGHT, _JoinLogic  # noqa: E402
+
+_FILL_BATCH_SIZE = 100_000
+
+
+def _values(rng: random.Random, count: int, keys: int) -> List[Tuple[str, int, Any]]:
+    return [
+        (f"user_{rng.randrange(keys)}", rng.choice((_LEFT, _RIGHT)), rng.random())
+        for _ in range(count)
+    ]
+
+
+def _run(
+    state_path: Path,
+    state_rows: int,
+    partitions: int,
+    ttl: Optional[timedelta],
+    args: argparse.Namespace,
+) -> Tuple[float, int]:
+    """Mean seconds per timed batch, and the values kept when timing."""
+    rng = random.Random(args.seed)
+    default = state._JOIN_PARTITIONS
+    state._JOIN_PARTITIONS = partitions
+    try:
+        logic = _JoinLogic(str(state_path), 1, None, ttl)
+        for start in range(0, state_rows, _FILL_BATCH_SIZE):
+            count = min(_FILL_BATCH_SIZE, state_rows - start)
+            logic.on_batch(_values(rng, count, args.keys))
+        conn = logic._open_for("user_0")
+        kept = sum(
+            conn.execute(f"SELECT count(*) FROM {table}").fetchall()[0][0]
+            for table in logic._tables()
+        )
+        batches = [
+            _values(rng, args.batch_size, args.keys) for _ in range(args.batches)
+        ]
+        start_time = time.perf_counter()
+        for batch in batches:
+            logic.on_batch(batch)
+        elapsed = time.perf_counter() - start_time
+        logic.on_eof()
+    finally:
+        state._JOIN_PARTITIONS = default
+    return elapsed / args.batches, kept
+
+
+def main() -> None:
+    """Run the benchmark and print batch latency per state size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--states",
+        default="0,500000,2000000",
+        help="comma separated numbers of values to fill (default: %(default)s)",
+    )
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--ttl", type=float, default=1.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    configs = (
+        ("one table", 1, None),
+        ("partitioned", state._JOIN_PARTITIONS, None),
+        (f"ttl {args.ttl:g}s", state._JOIN_PARTITIONS, timedelta(seconds=args.ttl)),
+    )
+    print(
+        f"batches of {args.batch_size} values over {args.keys:,} keys; "
+        "ms per batch (values kept)"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for state_rows in (int(s) for s in args.states.split(",")):
+            cells = []
+            for label, partitions, ttl in configs:
+                path = Path(tmp) / f"{label.replace(' ', '_')}_{state_rows}"
+                mean, kept = _run(path, state_rows, partitions, ttl, args)
+                cells.append(f"{label} {mean * 1000:7.2f} ({kept:,})")
+            print(f"{state_rows:>10,} filled: " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
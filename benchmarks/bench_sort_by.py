@@ -0,0 +1,126 @@
+"""Benchmark the effect of `sort_by` on ingest cost and query speed.
+
+Writes the same randomly ordered events through `DuckDBSinkPartition`
+twice, once in arrival order and once with `sort_by`, then runs
+selective time-range and tenant queries against both tables.
+
+Run with:
+
+```console
+$ python benchmarks/bench_sort_by.py --rows 2000000
+```
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("BYTEWAX_LICENSE", "1")
+
+import duckdb  # noqa: E402
+
+from bytewax.duckdb import DuckDBSinkPartition  # noqa: E402
+
+CREATE_TABLE_SQL = (
+    "CREATE TABLE events (ts TIMESTAMP WITH TIME ZONE, tenant INTEGER, value DOUBLE)"
+)
+QUERIES = {
+    "time range": "SELECT count(*), sum(value) FROM events "
+    "WHERE ts BETWEEN TIMESTAMPTZ '{lo}' AND TIMESTAMPTZ '{hi}'",
+    "tenant": "SELECT count(*), sum(value) FROM events WHERE tenant = 42",
+}
+
+
+def _batches(rows: int, batch_size: int, seed: int) -> List[List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    events = [
+        {
+            "ts": start + timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+            "tenant": rng.randrange(1_000),
+            "value": rng.random(),
+        }
+        for _ in range(rows)
+    ]
+    return [events[i : i + batch_size] for i in range(0, rows, batch_size)]
+
+
+def _ingest(
+    db_path: Path, batches: List[List[Dict[str, Any]]], sort_by: Optional[List[str]]
+) -> float:
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path), "events", CREATE_TABLE_SQL, None, sort_by=sort_by
+    )
+    start = time.perf_counter()
+    part.write_batch(batches)
+    elapsed = time.perf_counter() - start
+    part.close()
+    return elapsed
+
+
+def _query(db_path: Path, sql: str, repeat: int) -> float:
+    conn = duckdb.connect(str(db_path), read_only=True)
+    conn.execute(sql).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql).fetchall()
+    elapsed = (time.perf_counter() - start) / repeat
+    conn.close()
+    return elapsed
+
+
+def main() -> None:
+    """Run the benchmark and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=122_880)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--sort-by",
+        default="tenant,ts",
+        help="comma separated columns to sort by (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    batches = _batches(args.rows, args.batch_size, args.seed)
+    lo = datetime(2024, 1, 10, tzinfo=timezone.utc)
+    sql = {
+        name: query.format(lo=lo, hi=lo + timedelta(hours=6))
+        for name, query in QUERIES.items()
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, sort_by in (
+            ("arrival order", None),
+            ("sorted", args.sort_by.split(",")),
+        ):
+            db_path = Path(tmp) / f"{label.replace(' ', '_')}.duckdb"
+            ingest = _ingest(db_path, batches, sort_by)
+            results[label] = (
+                ingest,
+                {n: _query(db_path, q, args.repeat) for n, q in sql.items()},
+            )
+
+    print(f"{args.rows:,} rows in batches of {args.batch_size:,}")
+    for label, (ingest, queries) in results.items():
+        print(
+            f"{label:>14}: ingest {args.rows / ingest:>12,.0f} rows/s  "
+            + "  ".join(f"{n} {t * 1000:8.2f} ms" for n, t in queries.items())
+        )
+    base_ingest, base_queries = results["arrival order"]
+    ingest, queries = results["sorted"]
+    print(
+        f"{'speedup':>14}: ingest {base_ingest / ingest:>12.2f}x       "
+        + "  ".join(f"{n} {base_queries[n] / t:8.2f}x  " for n, t in queries.items())
+    )
+
+
+if __name__ == "__main__":
+    main()
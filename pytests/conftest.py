@@ -0,0 +1,18 @@
+"""Shared fixtures for the bytewax.duckdb tests."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def suppress_license_warning(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Suppress the license warning in tests."""
+    monkeypatch.setitem(os.environ, "BYTEWAX_LICENSE", "1")
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    """Generate a temporary path for the DuckDB database file."""
+    return tmp_path / "test_duckdb.db"
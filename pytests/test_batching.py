@@ -0,0 +1,154 @@
+"""Tests for bytewax.duckdb.batching and adaptive batching in the operator."""
+
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import duckdb
+import pytest
+from prometheus_client import REGISTRY
+
+import bytewax.duckdb.operators as duck_op
+import bytewax.operators as op
+from bytewax.dataflow import Dataflow
+from bytewax.duckdb.batching import (
+    AdaptiveBatching,
+    BatchTuner,
+    _AdaptiveCollectLogic,
+    _AdaptiveCollectState,
+)
+from bytewax.operators import StatefulLogic
+from bytewax.testing import TestingSource, run_main
+
+
+def _tuner(target_latency: Optional[timedelta] = None) -> BatchTuner:
+    tuner = BatchTuner(
+        AdaptiveBatching(
+            min_batch_size=10,
+            max_batch_size=100_000,
+            target_latency=target_latency,
+        ),
+        batch_size=1_000,
+        timeout=timedelta(seconds=1),
+    )
+    # 10ms per insert plus 1us per row.
+    for rows in (100, 1_000, 10_000, 100, 1_000, 10_000):
+        tuner.observe_insert(rows, 0.01 + rows * 1e-6)
+    return tuner
+
+
+def test_tuner_uses_initial_values_until_measured() -> None:
+    """Test that the tuner plans the initial values before any insert."""
+    tuner = BatchTuner(AdaptiveBatching(), 5_000, timedelta(seconds=2))
+    assert tuner.plan(None) == (5_000, timedelta(seconds=2))
+
+
+def test_tuner_fits_insert_cost() -> None:
+    """Test that the tuner fits the overhead and per-row cost of inserts."""
+    cost = _tuner().insert_cost()
+    assert cost is not None
+    overhead, per_row = cost
+    assert overhead == pytest.approx(0.01)
+    assert per_row == pytest.approx(1e-6)
+
+
+def test_tuner_keeps_overhead_when_batch_sizes_converge() -> None:
+    """Test that the fit survives batches that all have the same size."""
+    tuner = _tuner()
+    planned = tuner.plan(rate=50_000.0)
+    assert tuner.insert_cost() is not None
+    # Once every batch has the planned size, the sizes no longer vary.
+    for _ in range(200):
+        tuner.observe_insert(100_000, 0.01 + 100_000 * 1e-6)
+    cost = tuner.insert_cost()
+    assert cost is not None
+    overhead, per_row = cost
+    assert overhead == pytest.approx(0.01)
+    assert per_row == pytest.approx(1e-6)
+    assert tuner.plan(rate=50_000.0) == planned
+
+
+def test_tuner_waits_for_varied_batch_sizes() -> None:
+    """Test that the tuner needs varied batch sizes before fitting."""
+    tuner = BatchTuner(AdaptiveBatching(), 5_000, timedelta(seconds=2))
+    for _ in range(10):
+        tuner.observe_insert(5_000, 0.1)
+    assert tuner.insert_cost() is None
+    assert tuner.plan(None) == (5_000, timedelta(seconds=2))
+
+
+def test_tuner_maximizes_throughput() -> None:
+    """Test that the tuner amortizes the overhead without a target."""
+    # Overhead is 5% of an insert at 190_000 rows, capped at the max,
+    # which takes 2s to fill.
+    size, timeout = _tuner().plan(rate=50_000.0)
+    assert size == 100_000
+    assert timeout == timedelta(seconds=2)
+
+
+def test_tuner_meets_target_latency() -> None:
+    """Test that the tuner sizes batches to meet the target latency."""
+    tuner = _tuner(target_latency=timedelta(milliseconds=110))
+    # 100ms left after the overhead; each row takes 1us to insert and
+    # 9us to arrive.
+    size, timeout = tuner.plan(rate=1 / 9e-6)
+    assert size == pytest.approx(10_000, abs=1)
+    assert timeout.total_seconds() == pytest.approx(0.09, abs=1e-3)
+
+    # Slow keys get the smallest batches and wait out the budget.
+    size, timeout = tuner.plan(rate=10.0)
+    assert size == 10
+    assert timeout.total_seconds() == pytest.approx(0.1, abs=1e-3)
+
+
+def test_adaptive_collect_discards_emitted_keys() -> None:
+    """Test that a key's state is discarded once its batch is emitted."""
+    tuner = BatchTuner(
+        AdaptiveBatching(min_batch_size=2, max_batch_size=2),
+        batch_size=2,
+        timeout=timedelta(seconds=1),
+    )
+    logic: _AdaptiveCollectLogic[int] = _AdaptiveCollectLogic(
+        tuner, _AdaptiveCollectState()
+    )
+    assert logic.on_item(1) == ([], StatefulLogic.RETAIN)
+    time.sleep(0.01)
+    assert logic.on_item(2) == ([[1, 2]], StatefulLogic.DISCARD)
+    rate = tuner.key_rate()
+    assert rate is not None
+    assert 0 < rate <= 200
+
+    # A key arriving later is planned with the rate, and discarded too.
+    logic = _AdaptiveCollectLogic(tuner, _AdaptiveCollectState())
+    assert logic.on_item(3) == ([], StatefulLogic.RETAIN)
+    assert logic.on_notify() == ([[3]], StatefulLogic.DISCARD)
+
+
+def test_duckdb_operator_adaptive(db_path: Path) -> None:
+    """Test that the operator writes every row with adaptive batching."""
+    flow = Dataflow("duckdb")
+
+    def create_dict(value: int) -> Tuple[str, Dict[str, Union[int, str]]]:
+        return (str(value % 3), {"id": value, "name": f"Name_{value}"})
+
+    inp = op.input("inp", flow, TestingSource(range(1_000)))
+    dict_stream = op.map("dict", inp, create_dict)
+    duck_op.output(
+        "adaptive_out",
+        dict_stream,
+        str(db_path),
+        "test_table",
+        "CREATE TABLE IF NOT EXISTS test_table (id INTEGER, name TEXT)",
+        batch_size=100,
+        adaptive=AdaptiveBatching(min_batch_size=10, max_batch_size=500),
+    )
+    run_main(flow)
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute("SELECT COUNT(*) FROM test_table").fetchone() == (1_000,)
+    size = REGISTRY.get_sample_value(
+        "bytewax_duckdb_batch_size", {"step_id": "duckdb.adaptive_out"}
+    )
+    assert size is not None
+    assert 10 <= size <= 500
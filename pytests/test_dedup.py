@@ -0,0 +1,132 @@
+"""Tests for bytewax.duckdb.dedup and deduplication in the sink."""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from bytewax.duckdb import DuckDBSinkPartition
+from bytewax.duckdb.dedup import ExpiringBloomFilter
+
+
+def test_filter_has_no_false_negatives() -> None:
+    """Test that every added key is reported as possibly seen."""
+    bloom = ExpiringBloomFilter(1_000, 0.01, timedelta(hours=1))
+    for i in range(1_000):
+        bloom.add((i, f"k{i}"))
+    assert all(bloom.might_contain((i, f"k{i}")) for i in range(1_000))
+    false_positives = sum(bloom.might_contain((i, "other")) for i in range(1_000))
+    assert false_positives < 50
+
+
+def test_filter_expires_keys_after_ttl() -> None:
+    """Test that keys are forgotten once their bucket outlives the TTL."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bloom = ExpiringBloomFilter(100, 0.01, timedelta(minutes=4), buckets=4)
+    bloom.add("old", start)
+    bloom.add("new", start + timedelta(minutes=4))
+
+    later = start + timedelta(minutes=5)
+    assert not bloom.might_contain("old", later)
+    assert bloom.might_contain("new", later)
+
+
+def test_filter_snapshot_round_trips() -> None:
+    """Test that a filter restored from a snapshot remembers its keys."""
+    bloom = ExpiringBloomFilter(100, 0.01, timedelta(hours=1))
+    bloom.add(("a", 1))
+    restored = ExpiringBloomFilter(
+        100, 0.01, timedelta(hours=1), resume_state=bloom.snapshot()
+    )
+    assert restored.might_contain(("a", 1))
+
+
+def test_sink_drops_duplicates_across_batches_and_restarts(db_path: Path) -> None:
+    """Test that duplicates are dropped, including after resuming."""
+    create_table_sql = "CREATE TABLE events (id INTEGER, source TEXT, value DOUBLE)"
+
+    def rows(ids: range) -> list:
+        return [{"id": i, "source": "s", "value": float(i)} for i in ids]
+
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path), "events", create_table_sql, None, dedup_keys=["id", "source"]
+    )
+    part.write_batch([rows(range(10)) + rows(range(5))])
+    part.write_batch([rows(range(5, 15))])
+    state = part.snapshot()
+    assert part.rows_deduplicated == 10
+    part.close()
+
+    part = DuckDBSinkPartition(
+        str(db_path), "events", None, state, dedup_keys=["id", "source"]
+    )
+    part.write_batch([rows(range(10, 20))])
+    part.close()
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT id) FROM events"
+    ).fetchone() == (
+        20,
+        20,
+    )
+
+
+def test_sink_keeps_false_positives(db_path: Path) -> None:
+    """Test that filter false positives are confirmed and kept."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER)",
+        None,
+        dedup_keys=["id"],
+        # A tiny, saturated filter reports nearly every key as seen.
+        dedup_capacity=1,
+        dedup_error_rate=0.5,
+    )
+    for i in range(50):
+        part.write_batch([[{"id": i}]])
+    assert part.rows_deduplicated == 0
+    count = part.conn.execute("SELECT COUNT(*) FROM events").fetchone()
+    assert count == (50,)
+    part.close()
+
+
+def test_sink_confirms_against_rows_within_ttl(db_path: Path) -> None:
+    """Test that the time column limits confirmations to recent rows."""
+    now = datetime.now(timezone.utc)
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER, ts TIMESTAMP WITH TIME ZONE)",
+        None,
+        dedup_keys=["id"],
+        dedup_ttl=timedelta(minutes=10),
+        dedup_time_column="ts",
+        # A saturated filter sends every key to the confirmation query.
+        dedup_capacity=1,
+        dedup_error_rate=0.5,
+    )
+    part.write_batch(
+        [[{"id": 1, "ts": now - timedelta(hours=1)}, {"id": 2, "ts": now}]]
+    )
+    # Row 1 is outside the TTL so it is not looked up; row 2 is.
+    part.write_batch([[{"id": 1, "ts": now}, {"id": 2, "ts": now}]])
+    assert part.rows_deduplicated == 1
+    count = part.conn.execute("SELECT COUNT(*) FROM events").fetchone()
+    assert count == (3,)
+    part.close()
+
+
+def test_sink_rejects_spill_with_dedup(tmp_path: Path, db_path: Path) -> None:
+    """Test that deduplication cannot be combined with a spill."""
+    with pytest.raises(ValueError, match="spill_path"):
+        DuckDBSinkPartition(
+            str(db_path),
+            "events",
+            "CREATE TABLE events (id INTEGER)",
+            None,
+            dedup_keys=["id"],
+            spill_path=str(tmp_path / "spill"),
+        )
@@ -0,0 +1,101 @@
+"""Tests for bytewax.duckdb.inputs."""
+
+from pathlib import Path
+from typing import List
+
+import duckdb
+import pyarrow as pa  # type: ignore
+import pytest
+
+import bytewax.operators as op
+from bytewax.dataflow import Dataflow
+from bytewax.duckdb.inputs import DuckDBFileSource
+from bytewax.testing import TestingSink, run_main
+
+
+@pytest.fixture
+def parquet_dir(tmp_path: Path) -> Path:
+    """Three Parquet files of 10_240 rows in 5 row groups each."""
+    for i in range(3):
+        duckdb.execute(
+            f"COPY (SELECT {i * 10_240} + range AS id, range % 7 AS v "
+            f"FROM range(10_240)) TO '{tmp_path}/part-{i}.parquet' "
+            "(ROW_GROUP_SIZE 2048)"
+        )
+    return tmp_path
+
+
+def _run(source: DuckDBFileSource) -> List[pa.RecordBatch]:
+    flow = Dataflow("file_source")
+    out: List[pa.RecordBatch] = []
+    op.output("out", op.input("inp", flow, source), TestingSink(out))
+    run_main(flow)
+    return out
+
+
+def test_file_source_reads_every_file(parquet_dir: Path) -> None:
+    """Test that DuckDBFileSource reads the matching rows of every file."""
+    batches = _run(
+        DuckDBFileSource(
+            f"{parquet_dir}/*.parquet", columns=["id"], where="v = 0", batch_size=500
+        )
+    )
+    assert all(batch.schema.names == ["id"] for batch in batches)
+    ids = sorted(id_ for batch in batches for id_ in batch.column("id").to_pylist())
+    assert ids == [i * 10_240 + j for i in range(3) for j in range(0, 10_240, 7)]
+
+
+def test_file_source_splits_row_groups(parquet_dir: Path) -> None:
+    """Test that large files are split into parts by row group."""
+    source = DuckDBFileSource(f"{parquet_dir}/*.parquet", row_groups_per_part=2)
+    parts = source.list_parts()
+    assert len(parts) == 9
+    assert parts[:3] == [
+        f"{parquet_dir}/part-0.parquet#rows=0-4096",
+        f"{parquet_dir}/part-0.parquet#rows=4096-8192",
+        f"{parquet_dir}/part-0.parquet#rows=8192-10240",
+    ]
+
+    rows = sum(batch.num_rows for batch in _run(source))
+    assert rows == 30_720
+
+
+def test_file_source_resumes(parquet_dir: Path) -> None:
+    """Test that a part resumes after the last row it emitted."""
+    source = DuckDBFileSource(
+        f"{parquet_dir}/part-0.parquet", where="v > 0", batch_size=1_000
+    )
+    (part_key,) = source.list_parts()
+    part = source.build_part("inp", part_key, None)
+    first = part.next_batch()[0]
+    position = part.snapshot()
+    part.close()
+
+    part = source.build_part("inp", part_key, position)
+    rest = []
+    try:
+        while True:
+            rest.extend(part.next_batch())
+    except StopIteration:
+        part.close()
+    ids = first.column("id").to_pylist()
+    for batch in rest:
+        ids.extend(batch.column("id").to_pylist())
+    assert ids == [i for i in range(10_240) if i % 7 > 0]
+
+
+def test_file_source_csv(tmp_path: Path) -> None:
+    """Test that reader options are passed to the CSV reader."""
+    (tmp_path / "a.csv").write_text("id;name\n1;a\n2;b\n")
+    (tmp_path / "b.csv").write_text("id;name\n3;c\n")
+    source = DuckDBFileSource(
+        f"{tmp_path}/*.csv",
+        file_format="csv",
+        reader_options={"delim": ";", "columns": {"id": "BIGINT", "name": "VARCHAR"}},
+    )
+    rows = [row for batch in _run(source) for row in batch.to_pylist()]
+    assert sorted(rows, key=lambda row: row["id"]) == [
+        {"id": 1, "name": "a"},
+        {"id": 2, "name": "b"},
+        {"id": 3, "name": "c"},
+    ]
@@ -0,0 +1,69 @@
+"""Tests for bytewax.duckdb.registry."""
+
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import duckdb
+import pytest
+
+import bytewax.duckdb.operators as duck_op
+import bytewax.operators as op
+from bytewax.dataflow import Dataflow
+from bytewax.duckdb import registry
+from bytewax.testing import TestingSource, run_main
+
+
+def test_registry_shares_instances(tmp_path: Path) -> None:
+    """Test that connections to one file share an instance until closed."""
+    db_path = tmp_path / "shared.db"
+    first = registry.connect(str(db_path))
+    # Different spellings of the same file share an instance.
+    second = registry.connect(f"{tmp_path}/./shared.db")
+    assert registry.open_instances() == 1
+
+    first.execute("CREATE TABLE t (id INTEGER)")
+    first.execute("INSERT INTO t VALUES (1)")
+    assert second.execute("SELECT count(*) FROM t").fetchone() == (1,)
+
+    registry.close(first)
+    registry.close(first)
+    assert second.execute("SELECT count(*) FROM t").fetchone() == (1,)
+    registry.close(second)
+    assert registry.open_instances() == 0
+
+
+def test_registry_keeps_anonymous_memory_private() -> None:
+    """Test that each in-memory connection gets its own database."""
+    first = registry.connect(":memory:")
+    second = registry.connect(":memory:")
+    first.execute("CREATE TABLE t (id INTEGER)")
+    with pytest.raises(duckdb.CatalogException):
+        second.execute("SELECT * FROM t")
+    registry.close(first)
+    registry.close(second)
+    assert registry.open_instances() == 0
+
+
+def test_outputs_share_one_instance(db_path: Path) -> None:
+    """Test that two outputs to one file write through one instance."""
+    flow = Dataflow("duckdb")
+
+    def create_dict(value: int) -> Tuple[str, Dict[str, Union[int, str]]]:
+        return (str(value), {"id": value, "name": f"Name_{value}"})
+
+    inp = op.input("inp", flow, TestingSource(range(100)))
+    dict_stream = op.map("dict", inp, create_dict)
+    for table in ("first", "second"):
+        duck_op.output(
+            f"out_{table}",
+            dict_stream,
+            str(db_path),
+            table,
+            f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER, name TEXT)",
+        )
+    run_main(flow)
+
+    assert registry.open_instances() == 0
+    conn = duckdb.connect(str(db_path))
+    for table in ("first", "second"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone() == (100,)
@@ -1,32 +1,31 @@
 """Tests for the bytewax.duckdb module."""
 
+import json
 import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import duckdb
+import pyarrow as pa  # type: ignore
 import pytest
 
 import bytewax.duckdb.operators as duck_op
 import bytewax.operators as op
 from bytewax.dataflow import Dataflow
-from bytewax.duckdb import DuckDBSink
+from bytewax.duckdb import (
+    DuckDBSink,
+    DuckDBSinkPartition,
+    DuckDBSpoolPartition,
+    registry,
+    spool,
+)
+from bytewax.duckdb.summary import Summary
 from bytewax.testing import TestingSource, run_main
 
 
-# Skip the license warning in tests
-@pytest.fixture(autouse=True)
-def suppress_license_warning(monkeypatch: pytest.MonkeyPatch) -> None:
-    """Suppress the license warning in tests."""
-    monkeypatch.setitem(os.environ, "BYTEWAX_LICENSE", "1")
-
-
-@pytest.fixture
-def db_path(tmp_path: Path) -> Path:
-    """Generate a temporary path for the DuckDB database file."""
-    return tmp_path / "test_duckdb.db"
-
-
 @pytest.fixture
 def table_name() -> str:
     """Fixture for the table name."""
@@ -106,3 +105,975 @@ def test_duckdb_operator(db_path: Path, table_name: str) -> None:
 
     second_result = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
     assert second_result == (200,)
+
+
+class _SlowPartition(DuckDBSinkPartition):
+    """Local stand-in for a remote target.
+
+    Injects latency into every insert and optionally fails the first few
+    attempts with a transient error.
+    """
+
+    def __init__(self, *args: Any, fail_first: int = 0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures_left = fail_first
+
+    def _insert_once(
+        self, conn: duckdb.DuckDBPyConnection, pa_table: Any, staged: bool = True
+    ) -> None:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = self.failures_left > 0
+            self.failures_left -= 1
+        try:
+            time.sleep(0.05)
+            if fail:
+                msg = "simulated network error"
+                raise duckdb.IOException(msg)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        super()._insert_once(conn, pa_table, staged)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_duckdb_pool_inserts_concurrently(
+    db_path: Path,
+    table_name: str,
+    create_table_sql: str,
+    monkeypatch: pytest.MonkeyPatch,
+    ordered: bool,
+) -> None:
+    """Test that a connection pool overlaps inserts across `write_batch` calls."""
+    lock = threading.Lock()
+    in_flight = [0]
+    max_in_flight = [0]
+    insert_once = DuckDBSinkPartition._insert_once
+
+    def slow_insert_once(
+        self: DuckDBSinkPartition,
+        conn: duckdb.DuckDBPyConnection,
+        pa_table: Any,
+        staged: bool = True,
+    ) -> None:
+        with lock:
+            in_flight[0] += 1
+            max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        # Later batches of each round finish first.
+        (row_id,) = pa_table.column("id").to_pylist()
+        time.sleep(0.02 * (4 - row_id % 4))
+        with lock:
+            in_flight[0] -= 1
+        insert_once(self, conn, pa_table, staged)
+
+    monkeypatch.setattr(DuckDBSinkPartition, "_insert_once", slow_insert_once)
+
+    def create_dict(value: int) -> Tuple[str, Dict[str, Union[int, str]]]:
+        return (str(value), {"id": value, "name": f"Name_{value}"})
+
+    flow = Dataflow("duckdb")
+    inp = op.input("inp", flow, TestingSource(range(16)))
+    duck_op.output(
+        "out",
+        op.map("dict", inp, create_dict),
+        str(db_path),
+        table_name,
+        create_table_sql,
+        batch_size=1,
+        pool_size=4,
+        ordered=ordered,
+    )
+    run_main(flow)
+
+    # Bytewax writes one batch per `write_batch` call.
+    assert max_in_flight[0] == 4
+    conn = duckdb.connect(str(db_path))
+    ids = [
+        row_id
+        for (row_id,) in conn.execute(
+            f"SELECT id FROM {table_name} ORDER BY rowid"
+        ).fetchall()
+    ]
+    if ordered:
+        assert ids == list(range(16))
+    else:
+        assert sorted(ids) == list(range(16))
+
+
+def test_duckdb_pool_ordered_rolls_back_after_failed_insert(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that an ordered insert is not committed after an earlier one failed."""
+    part = _SlowPartition(
+        str(db_path), table_name, create_table_sql, None, pool_size=2, fail_first=1
+    )
+    for i in range(2):
+        part.write_batch([[{"id": i, "name": f"Name_{i}"}]])
+    with pytest.raises(duckdb.IOException):
+        part.snapshot()
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (0,)
+    # The later insert failed too; its error is not what is under test.
+    part._pending.clear()
+    part.close()
+
+
+def test_duckdb_pool_unordered_flushes_on_snapshot(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that unordered inserts are all committed by `snapshot`."""
+    part = _SlowPartition(
+        str(db_path), table_name, create_table_sql, None, pool_size=2, ordered=False
+    )
+    for i in range(3):
+        part.write_batch([[{"id": i, "name": f"Name_{i}"}]])
+    part.snapshot()
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (3,)
+    part.close()
+
+
+def test_duckdb_retries_transient_errors(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that transient errors are retried up to `max_retries` times."""
+    part = _SlowPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        fail_first=2,
+        max_retries=2,
+        retry_backoff=timedelta(milliseconds=1),
+    )
+    part.write_batch([[{"id": 1, "name": "Name_1"}]])
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (1,)
+
+    part.failures_left = 2
+    part.max_retries = 1
+    with pytest.raises(duckdb.IOException):
+        part.write_batch([[{"id": 2, "name": "Name_2"}]])
+    part.close()
+
+
+def test_duckdb_bisect_dead_letters_bad_rows(db_path: Path, table_name: str) -> None:
+    """Test that bad rows are isolated and the rest of the batch is written."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+        None,
+        on_error="bisect",
+    )
+    rows: List[Dict[str, Any]] = [{"id": i, "name": f"Name_{i}"} for i in range(10)]
+    rows[3]["name"] = None
+    rows[7]["id"] = 1
+    part.write_batch([rows])
+    assert part.rows_rejected == 2
+
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (8,)
+    rejected = part.conn.execute(
+        f"SELECT row->>'name', error FROM {table_name}_rejected ORDER BY row->>'id'"
+    ).fetchall()
+    assert [name for name, _error in rejected] == ["Name_7", None]
+    assert all(error for _name, error in rejected)
+    part.close()
+
+
+def test_duckdb_bisect_dead_letters_to_parquet(
+    db_path: Path, tmp_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that rows failing Arrow conversion are written to Parquet."""
+    dl_path = tmp_path / "rejected"
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        on_error="bisect",
+        dead_letter_path=str(dl_path),
+    )
+    rows = [{"id": 1, "name": "a"}, {"id": "two", "name": "b"}]
+    part.write_batch([rows])
+    assert part.rows_rejected == 1
+
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (1,)
+    rejected = duckdb.sql(f"SELECT row FROM '{dl_path}/*.parquet'").fetchall()
+    assert len(rejected) == 1
+    part.close()
+
+
+def test_duckdb_raises_on_bad_rows_by_default(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that bad rows fail the whole batch unless bisection is enabled."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path), table_name, create_table_sql, None
+    )
+    with pytest.raises(duckdb.ConversionException):
+        part.write_batch([[{"id": "x", "name": "a"}]])
+    part.close()
+
+
+def test_duckdb_sort_by(db_path: Path, table_name: str, create_table_sql: str) -> None:
+    """Test that each batch is inserted sorted by the `sort_by` columns."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path), table_name, create_table_sql, None, sort_by=["name", "id"]
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i % 3}"} for i in range(9)]])
+    rows = part.conn.execute(f"SELECT name, id FROM {table_name}").fetchall()
+    assert rows == sorted(rows)
+    part.close()
+
+
+def test_duckdb_retention_and_compaction(db_path: Path) -> None:
+    """Test that expired rows are deleted in the background."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER, ts TIMESTAMP WITH TIME ZONE)",
+        None,
+        retention_column="ts",
+        retention_ttl=timedelta(days=1),
+        compact_interval=timedelta(milliseconds=10),
+        maintenance_interval=timedelta(milliseconds=10),
+    )
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=2)
+    part.write_batch([[{"id": i, "ts": old if i % 2 else now} for i in range(25_000)]])
+
+    deadline = time.monotonic() + 10
+    while part.rows_expired < 12_500 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    part.close()
+
+    assert part.rows_expired == 12_500
+    conn = duckdb.connect(str(db_path))
+    counts = conn.execute(
+        "SELECT COUNT(*), COUNT(*) FILTER (WHERE ts < $cutoff) FROM events",
+        {"cutoff": now - timedelta(days=1)},
+    ).fetchone()
+    assert counts == (12_500, 0)
+
+
+def test_duckdb_compaction_merges_row_groups(db_path: Path) -> None:
+    """Test that a fragmented table is rewritten into fewer row groups."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+        None,
+        compact_interval=timedelta(milliseconds=10),
+        maintenance_interval=timedelta(hours=1),
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(500_000)]])
+    part.conn.execute("CREATE INDEX events_name ON events (name)")
+    # Checkpoints never vacuum an indexed table, so deleting nine rows
+    # in ten leaves every row group mostly empty.
+    part.conn.execute("CHECKPOINT")
+    part.conn.execute("DELETE FROM events WHERE id % 10 <> 0")
+    part.conn.execute("CHECKPOINT")
+
+    def row_groups() -> int:
+        (count,) = part.conn.execute(
+            "SELECT count(DISTINCT row_group_id) FROM pragma_storage_info('events')"
+        ).fetchall()[0]
+        return count
+
+    assert row_groups() > 2
+    part._compact()
+    assert row_groups() == 1
+    part.close()
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute("SELECT COUNT(*), SUM(id) FROM events").fetchone() == (
+        50_000,
+        sum(range(0, 500_000, 10)),
+    )
+    assert conn.execute(
+        "SELECT index_name FROM duckdb_indexes() WHERE table_name = 'events'"
+    ).fetchall() == [("events_name",)]
+    with pytest.raises(duckdb.ConstraintException):
+        conn.execute("INSERT INTO events VALUES (0, 'again')")
+
+
+def test_duckdb_tiered_flushes_on_snapshot(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that tiered mode stages rows in memory until a flush."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        tiered=True,
+        flush_interval=timedelta(hours=1),
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(10)]])
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (0,)
+
+    part.snapshot()
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (10,)
+
+    part.write_batch([[{"id": 10, "name": "Name_10"}]])
+    part.close()
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone() == (11,)
+
+
+def test_duckdb_tiered_flushes_in_background(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that reaching `flush_rows` triggers a background flush."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        tiered=True,
+        flush_rows=5,
+        flush_interval=timedelta(hours=1),
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(5)]])
+
+    deadline = time.monotonic() + 10
+    count = None
+    while count != (5,) and time.monotonic() < deadline:
+        time.sleep(0.01)
+        count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (5,)
+    part.close()
+
+
+def test_duckdb_tiered_and_plain_share_one_file(db_path: Path) -> None:
+    """Test that tiered and plain sinks on one file share its instance."""
+
+    def sink(table: str, tiered: bool) -> DuckDBSinkPartition:
+        return DuckDBSinkPartition(
+            str(db_path),
+            table,
+            f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER)",
+            None,
+            tiered=tiered,
+            flush_interval=timedelta(hours=1),
+        )
+
+    plain = sink("plain", False)
+    tiered = [sink("tiered", True), sink("tiered", True)]
+    assert registry.open_instances() == 1
+    for i in range(3):
+        plain.write_batch([[{"id": i}]])
+        for part in tiered:
+            part.write_batch([[{"id": i}]])
+    tiered[0].snapshot()
+    count = plain.conn.execute("SELECT COUNT(*) FROM tiered").fetchone()
+    assert count == (3,)
+    for part in [plain, *tiered]:
+        part.close()
+    assert registry.open_instances() == 0
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute("SELECT COUNT(*) FROM plain").fetchone() == (3,)
+    assert conn.execute("SELECT COUNT(*) FROM tiered").fetchone() == (6,)
+
+
+def test_duckdb_tiered_bisects_on_flush(db_path: Path, table_name: str) -> None:
+    """Test that constraint violations found on flush are dead-lettered."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+        None,
+        on_error="bisect",
+        tiered=True,
+        flush_interval=timedelta(hours=1),
+    )
+    rows: List[Dict[str, Any]] = [{"id": i, "name": f"Name_{i}"} for i in range(10)]
+    rows[3]["name"] = None
+    rows[7]["id"] = 1
+    part.write_batch([rows])
+    part.snapshot()
+    assert part.rows_rejected == 2
+
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (8,)
+    rejected = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}_rejected")
+    assert rejected.fetchone() == (2,)
+    part.close()
+
+
+def test_duckdb_tiered_keeps_rows_of_failed_flush(
+    db_path: Path, table_name: str
+) -> None:
+    """Test that a failed flush leaves its rows staged for the next one."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name TEXT)",
+        None,
+        tiered=True,
+        flush_interval=timedelta(hours=1),
+    )
+    part.conn.execute(f"INSERT INTO {table_name} VALUES (1, 'taken')")
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(10)]])
+    with pytest.raises(duckdb.ConstraintException):
+        part.snapshot()
+    assert part._staged_rows == 10
+
+    part.conn.execute(f"DELETE FROM {table_name}")
+    part.snapshot()
+    count = part.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    assert count == (10,)
+    part.close()
+
+
+def test_duckdb_summaries(db_path: Path) -> None:
+    """Test that summary tables stay in sync with the raw inserts."""
+    summary = Summary(
+        "events_by_tenant",
+        group_by={"tenant": "tenant"},
+        aggregates={
+            "events": ("count", "*"),
+            "total": ("sum", "value"),
+            "low": ("min", "value"),
+            "high": ("max", "value"),
+            "users": ("approx_distinct", "user_id"),
+        },
+    )
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (tenant TEXT, value INTEGER, user_id INTEGER)",
+        None,
+        summaries=[summary],
+    )
+    for batch in range(4):
+        part.write_batch(
+            [
+                [
+                    {"tenant": f"t{i % 2}", "value": batch * 100 + i, "user_id": i}
+                    for i in range(100)
+                ]
+            ]
+        )
+    part.close()
+
+    conn = duckdb.connect(str(db_path))
+    expected = conn.execute(
+        "SELECT tenant, count(*), sum(value), min(value), max(value) "
+        "FROM events GROUP BY ALL ORDER BY tenant"
+    ).fetchall()
+    actual = conn.execute(
+        "SELECT tenant, events, total, low, high FROM events_by_tenant ORDER BY tenant"
+    ).fetchall()
+    assert actual == expected
+    for (users,) in conn.execute("SELECT users FROM events_by_tenant").fetchall():
+        assert 45 <= users <= 55
+
+
+def test_duckdb_publishes_read_only_snapshots(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that snapshots are published and the oldest are pruned."""
+    publish_path = tmp_path / "published"
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        publish_path=str(publish_path),
+        publish_interval=timedelta(milliseconds=10),
+        publish_keep=2,
+        maintenance_interval=timedelta(milliseconds=10),
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(10)]])
+
+    deadline = time.monotonic() + 10
+    while not (publish_path / "LATEST").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    latest = (publish_path / "LATEST").read_text()
+    conn = duckdb.connect(
+        str(publish_path / latest / "database.duckdb"), read_only=True
+    )
+    assert conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone() == (10,)
+    conn.close()
+
+    part.write_batch([[{"id": 10, "name": "Name_10"}]])
+    part.close()
+
+    conn = duckdb.connect(
+        str(publish_path / "latest" / "database.duckdb"), read_only=True
+    )
+    assert conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone() == (11,)
+    versions = [entry for entry in os.listdir(publish_path) if entry.startswith("v")]
+    assert len(versions) == 2
+
+
+def test_duckdb_failed_publish_leaves_no_version(
+    tmp_path: Path,
+    db_path: Path,
+    table_name: str,
+    create_table_sql: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that a failed publish is cleaned up and does not fail close."""
+    publish_path = tmp_path / "published"
+
+    def publish_on_close(sql: Optional[str]) -> DuckDBSinkPartition:
+        part: DuckDBSinkPartition = DuckDBSinkPartition(
+            str(db_path),
+            table_name,
+            sql,
+            None,
+            publish_path=str(publish_path),
+            publish_keep=1,
+            maintenance_interval=timedelta(hours=1),
+        )
+        part.write_batch([[{"id": 1, "name": "Name_1"}]])
+        return part
+
+    def fail_rename(src: str, dst: str) -> None:
+        raise OSError(src)
+
+    part = publish_on_close(create_table_sql)
+    with monkeypatch.context() as m:
+        m.setattr(os, "rename", fail_rename)
+        part.close()
+    assert os.listdir(publish_path) == []
+    assert registry.open_instances() == 0
+
+    (publish_path / ".v20240101T000000000000Z.tmp").mkdir()
+    publish_on_close(None).close()
+    entries = os.listdir(publish_path)
+    assert not [entry for entry in entries if entry.startswith(".")]
+    versions = [entry for entry in entries if entry.startswith("v")]
+    assert versions == [(publish_path / "LATEST").read_text()]
+
+
+def test_duckdb_publishes_overlap_on_one_database(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that sinks on one database publish while the other one is."""
+    parts: List[DuckDBSinkPartition] = [
+        DuckDBSinkPartition(
+            str(db_path),
+            table_name,
+            sql,
+            None,
+            publish_path=str(tmp_path / f"published_{i}"),
+            publish_interval=timedelta(hours=1),
+        )
+        for i, sql in enumerate((create_table_sql, None))
+    ]
+    assert registry.open_instances() == 1
+    parts[0].write_batch([[{"id": 1, "name": "Name_1"}]])
+
+    # Hold the first sink's copy attached as if it were mid-publish.
+    first = parts[0]._maintenance_conn
+    first.execute(f"ATTACH '{tmp_path / 'copy.duckdb'}' AS {parts[0]._publish_db}")
+    parts[1]._publish()
+    first.execute(f"DETACH {parts[0]._publish_db}")
+    for part in parts:
+        part.close()
+
+    for i in range(2):
+        published = tmp_path / f"published_{i}"
+        latest = published / (published / "LATEST").read_text() / "database.duckdb"
+        conn = duckdb.connect(str(latest), read_only=True)
+        assert conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone() == (1,)
+        conn.close()
+
+
+def test_duckdb_publish_parquet(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that the Parquet format exports every table."""
+    publish_path = tmp_path / "published"
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        publish_path=str(publish_path),
+        publish_interval=timedelta(hours=1),
+        publish_format="parquet",
+    )
+    part.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(10)]])
+    part.close()
+
+    latest = publish_path / (publish_path / "LATEST").read_text()
+    count = duckdb.sql(f"SELECT COUNT(*) FROM '{latest}/{table_name}.parquet'")
+    assert count.fetchone() == (10,)
+
+
+def test_duckdb_sharded_sink(db_path: Path, table_name: str) -> None:
+    """Test that batches routed to spool shards reach the database."""
+    flow = Dataflow("duckdb")
+
+    def create_dict(value: int) -> Tuple[str, List[Dict[str, Union[int, str]]]]:
+        return (str(value), [{"id": value, "name": f"Name_{value}"}])
+
+    inp = op.input("inp", flow, TestingSource(range(100)))
+    dict_stream = op.map("dict", inp, create_dict)
+
+    sink = DuckDBSink(
+        str(db_path),
+        table_name,
+        f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER, name TEXT)",
+        shards=3,
+    )
+    assert sink.list_parts() == ["partition_0", "shard_1", "shard_2"]
+    op.output("out", dict_stream, sink)
+    run_main(flow)
+
+    conn = duckdb.connect(str(db_path))
+    result = conn.execute(f"SELECT COUNT(DISTINCT id) FROM {table_name}").fetchone()
+    assert result == (100,)
+    assert not list(Path(f"{db_path}.spool").glob("*/*.arrow"))
+
+
+def test_duckdb_merges_spool_in_background(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that the writer merges spooled batches while running."""
+    spool_path = str(tmp_path / "spool")
+    shard: DuckDBSpoolPartition = DuckDBSpoolPartition(spool_path, "shard_1")
+    shard.write_batch([[{"id": i, "name": f"Name_{i}"} for i in range(10)]])
+    shard.write_batch([[{"id": 10, "name": "Name_10"}]])
+
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        sort_by=["id"],
+        spool_path=spool_path,
+        merge_interval=timedelta(milliseconds=10),
+    )
+    deadline = time.monotonic() + 10
+    while part.rows_merged < 11 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert part.rows_merged == 11
+
+    shard.write_batch([[{"id": 11, "name": "Name_11"}]])
+    part.close()
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone() == (12,)
+    assert not list((tmp_path / "spool").glob("*/*"))
+
+
+def test_duckdb_rollover_buckets(db_path: Path) -> None:
+    """Test that rows land in daily buckets behind a view."""
+    create_sql = "CREATE TABLE IF NOT EXISTS events (id INTEGER, ts TIMESTAMP)"
+    today = datetime.now(timezone.utc).replace(tzinfo=None)
+    days = [today - timedelta(days=d) for d in (0, 1, 5)]
+
+    def rows(start: int) -> List[Dict[str, Any]]:
+        return [{"id": start + i, "ts": days[i % 3]} for i in range(30)]
+
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path), "events", create_sql, None, rollover_column="ts"
+    )
+    part.write_batch([rows(0)])
+    part.close()
+
+    # Buckets and the view survive a restart.
+    part = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        create_sql,
+        None,
+        rollover_column="ts",
+        retention_ttl=timedelta(days=3),
+        maintenance_interval=timedelta(milliseconds=10),
+    )
+    part.write_batch([rows(30)])
+    deadline = time.monotonic() + 10
+    while part.rows_expired < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    part.close()
+
+    assert part.rows_expired == 20
+    conn = duckdb.connect(str(db_path))
+    buckets = conn.execute(
+        "SELECT table_name FROM duckdb_tables() "
+        "WHERE table_name LIKE 'events_%' ORDER BY table_name"
+    ).fetchall()
+    assert buckets == [
+        (f"events_{days[1]:%Y_%m_%d}",),
+        (f"events_{days[0]:%Y_%m_%d}",),
+        ("events_template",),
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone() == (40,)
+
+
+def test_duckdb_rollover_keeps_braces_in_ddl(db_path: Path) -> None:
+    """Test that bucket DDL with braces in it is copied verbatim."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER, ts TIMESTAMP, tags TEXT DEFAULT '{}')",
+        None,
+        rollover_column="ts",
+    )
+    today = datetime.now(timezone.utc).replace(tzinfo=None)
+    part.write_batch([[{"id": 1, "ts": today, "tags": "{a}"}]])
+    assert part.conn.execute("SELECT tags FROM events").fetchall() == [("{a}",)]
+    defaults = part.conn.execute(
+        "SELECT DISTINCT column_default FROM duckdb_columns() "
+        "WHERE table_name LIKE 'events_%' AND column_name = 'tags'"
+    ).fetchall()
+    assert defaults == [("'{}'",)]
+    part.close()
+
+
+def test_duckdb_profiles_sampled_inserts(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that one in `profile_every` inserts is profiled and rotated."""
+    profile_path = tmp_path / "profiles"
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        profile_path=str(profile_path),
+        profile_every=2,
+        profile_keep=2,
+        step_id="flow.out",
+    )
+    for i in range(7):
+        part.write_batch([[{"id": i, "name": f"Name_{i}"}] * (i + 1)])
+    part.close()
+
+    names = sorted(os.listdir(profile_path))
+    assert len(names) == 2
+    with open(profile_path / names[-1]) as f:
+        record = json.load(f)
+    assert record["step_id"] == "flow.out"
+    assert record["partition"] == "partition_0"
+    assert record["table"] == table_name
+    assert record["rows"] == 6
+    (profile,) = record["profiles"]
+    assert profile["query_name"].startswith(f"INSERT INTO {table_name}")
+    assert profile["children"][0]["operator_type"] == "INSERT"
+
+
+def test_duckdb_spills_slow_inserts(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that batches spill once inserts are slow and drain in order."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        spill_path=str(tmp_path / "spill"),
+        spill_latency=timedelta(0),
+    )
+    for i in range(20):
+        part.write_batch([[{"id": i, "name": f"Name_{i}"}]])
+    state = part.snapshot()
+    part.close()
+
+    assert part.rows_spilled > 0
+    assert state is not None and "spill" in state
+    conn = duckdb.connect(str(db_path))
+    ids = conn.execute(f"SELECT id FROM {table_name} ORDER BY rowid").fetchall()
+    assert ids == [(i,) for i in range(20)]
+    assert not list((tmp_path / "spill").glob("*/*"))
+
+
+def test_duckdb_spill_resume_drops_replayed_segments(
+    tmp_path: Path, db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that segments spilled after the snapshot are not inserted."""
+    spill_path = str(tmp_path / "spill")
+    writer = spool.SpoolWriter(spill_path, table_name)
+    first = writer.write(pa.Table.from_pylist([{"id": 1, "name": "a"}]))
+    writer.write(pa.Table.from_pylist([{"id": 2, "name": "b"}]))
+
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        {"spill": os.path.basename(first)},
+        spill_path=spill_path,
+    )
+    part.close()
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(f"SELECT id FROM {table_name}").fetchall() == [(1,)]
+    assert not list((tmp_path / "spill").glob("*/*"))
+
+
+def test_duckdb_compaction_waits_for_spill_drain(
+    tmp_path: Path,
+    db_path: Path,
+    table_name: str,
+    create_table_sql: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that compaction does not swap tables under the spill drain."""
+    spill_path = str(tmp_path / "spill")
+    spool.SpoolWriter(spill_path, table_name).write(
+        pa.Table.from_pylist([{"id": 1, "name": "a"}])
+    )
+    draining = threading.Event()
+    release = threading.Event()
+
+    class _BlockedPartition(DuckDBSinkPartition):
+        def _insert_once(
+            self, conn: duckdb.DuckDBPyConnection, pa_table: Any, staged: bool = True
+        ) -> None:
+            draining.set()
+            release.wait(10)
+            super()._insert_once(conn, pa_table, staged)
+
+    compacted: List[str] = []
+
+    def record(self: Any, conn: duckdb.DuckDBPyConnection, table: str) -> bool:
+        compacted.append(table)
+        return False
+
+    monkeypatch.setattr(DuckDBSinkPartition, "_compact_table", record)
+    part = _BlockedPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        spill_path=spill_path,
+        compact_interval=timedelta(hours=1),
+        maintenance_interval=timedelta(hours=1),
+    )
+    assert draining.wait(10)
+    part._compact()
+    assert compacted == []
+
+    release.set()
+    deadline = time.monotonic() + 10
+    while part._spilling and time.monotonic() < deadline:
+        time.sleep(0.01)
+    part._compact()
+    assert compacted == [table_name]
+    part.close()
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(f"SELECT id FROM {table_name}").fetchall() == [(1,)]
+
+
+def test_duckdb_convert_workers(db_path: Path, tmp_path: Path) -> None:
+    """Test that chunks converted in the pool match a whole-batch conversion."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER, value DOUBLE, tag TEXT)",
+        None,
+        on_error="bisect",
+        dead_letter_path=str(tmp_path / "rejected"),
+        convert_workers=2,
+    )
+    # The first chunk has integer values and no tags, the second floats.
+    rows: List[Dict[str, Any]] = [
+        {"id": i, "value": i, "tag": None} for i in range(20_000)
+    ] + [{"id": i, "value": i + 0.5, "tag": "x"} for i in range(20_000, 40_000)]
+    rows[30_000]["id"] = "bad"
+    part.write_batch([rows, rows[:10]])
+    part.close()
+
+    assert part.rows_rejected == 1
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(
+        "SELECT COUNT(*), COUNT(tag), SUM(value) FROM events"
+    ).fetchone() == (40_009, 19_999, sum(range(40_000)) + 10_000 - 30_000.5 + 45)
+
+
+def test_duckdb_convert_workers_pipeline_across_calls(db_path: Path) -> None:
+    """Test that each batch is inserted by the next call or snapshot."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        "events",
+        "CREATE TABLE events (id INTEGER)",
+        None,
+        convert_workers=2,
+    )
+
+    def count() -> Any:
+        return part.conn.execute("SELECT COUNT(*) FROM events").fetchone()
+
+    part.write_batch([[{"id": i} for i in range(10)]])
+    assert count() == (0,)
+    part.write_batch([[{"id": i} for i in range(10, 15)]])
+    assert count() == (10,)
+    part.snapshot()
+    assert count() == (15,)
+    part.write_batch([[{"id": 15}]])
+    part.close()
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone() == (16,)
+
+
+def test_duckdb_operator_raw_json(db_path: Path, table_name: str) -> None:
+    """Test that raw JSON values are parsed by DuckDB with the given columns."""
+    flow = Dataflow("duckdb")
+
+    def create_json(value: int) -> Tuple[str, Union[bytes, str]]:
+        if value % 2:
+            return (str(value), json.dumps({"id": value, "name": f"Name_{value}"}))
+        # Pretty-printed, with a key that is not a column.
+        doc = json.dumps({"id": value, "extra": True}, indent=2)
+        return (str(value), doc.encode())
+
+    inp = op.input("inp", flow, TestingSource(range(100)))
+    json_stream = op.map("json", inp, create_json)
+    duck_op.output(
+        "out",
+        json_stream,
+        str(db_path),
+        table_name,
+        f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER, name TEXT)",
+        json_columns={"id": "INTEGER", "name": "VARCHAR"},
+    )
+    run_main(flow)
+
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(
+        f"SELECT COUNT(*), COUNT(name), SUM(id) FROM {table_name}"
+    ).fetchone() == (100, 50, sum(range(100)))
+
+
+def test_duckdb_raw_json_dead_letters_bad_documents(
+    db_path: Path, table_name: str, create_table_sql: str
+) -> None:
+    """Test that malformed documents and bad values are dead-lettered."""
+    part: DuckDBSinkPartition = DuckDBSinkPartition(
+        str(db_path),
+        table_name,
+        create_table_sql,
+        None,
+        on_error="bisect",
+        json_columns={"id": "INTEGER", "name": "VARCHAR"},
+    )
+    docs = [b'{"id": 1, "name": "a"}', b"{not json", b'{"id": "two"}', b'{"id": 4}']
+    part.write_batch([docs])
+    part.close()
+
+    assert part.rows_rejected == 2
+    conn = duckdb.connect(str(db_path))
+    assert conn.execute(f"SELECT id FROM {table_name} ORDER BY id").fetchall() == [
+        (1,),
+        (4,),
+    ]
+    rejected = conn.execute(
+        f"SELECT row->>'$' FROM {table_name}_rejected ORDER BY rejected_at"
+    ).fetchall()
+    assert sorted(rejected) == [('{"id": "two"}',), ("{not json",)]
@@ -0,0 +1,165 @@
+"""Tests for the DuckDB-backed stateful operators."""
+
+import pickle
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+import bytewax.duckdb.operators as duck_op
+import bytewax.operators as op
+from bytewax.dataflow import Dataflow
+from bytewax.duckdb import registry, state
+from bytewax.duckdb.state import (
+    _EPOCH,
+    _JOIN_PARTITIONS,
+    _LEFT,
+    _RIGHT,
+    _JoinLogic,
+    _WindowAggregateLogic,
+    _partition,
+    _shard,
+)
+from bytewax.testing import TestingSink, TestingSource, run_main
+
+
+def test_join(tmp_path: Path) -> None:
+    """Test that join pairs each value with earlier values of the other side."""
+    flow = Dataflow("join")
+    left = op.input(
+        "left", flow, TestingSource([("a", 1), ("b", 2), ("a", 3), ("c", 4)])
+    )
+    right = op.input("right", flow, TestingSource([("a", "x"), ("c", "y")]))
+    out: List[Tuple[str, Tuple[Any, Any]]] = []
+    joined = duck_op.join("join", left, right, str(tmp_path / "state"), shards=4)
+    op.output("out", joined, TestingSink(out))
+    run_main(flow)
+
+    assert sorted(out) == [("a", (1, "x")), ("a", (3, "x")), ("c", (4, "y"))]
+    assert registry.open_instances() == 0
+
+
+def test_join_resume_drops_state_after_snapshot(tmp_path: Path) -> None:
+    """Test that resuming deletes values added after the snapshot."""
+    state_path = str(tmp_path / "state")
+    logic = _JoinLogic(state_path, 1, None)
+    logic.on_batch([("a", 0, "before")])
+    snapshot = logic.snapshot()
+    logic.on_batch([("a", 0, "after")])
+    logic.on_eof()
+
+    # Items after the snapshot are replayed, so only earlier state joins.
+    logic = _JoinLogic(state_path, 1, snapshot)
+    out, _retain = logic.on_batch([("a", 1, "right")])
+    logic.on_eof()
+    assert list(out) == [("a", ("before", "right"))]
+
+
+def test_join_expires_values_after_ttl(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that values older than the ttl stop joining and are deleted."""
+    # Settle recent values into their partitions after every 3.
+    monkeypatch.setattr(state, "_JOIN_RECENT_ROWS", 3)
+    logic = _JoinLogic(str(tmp_path / "state"), 1, None, ttl=timedelta(seconds=1))
+    logic.on_batch([("a", _LEFT, "old")])
+    time.sleep(1.5)
+    out, _retain = logic.on_batch([("a", _RIGHT, "late"), ("b", _LEFT, "new")])
+    assert list(out) == []
+    out, _retain = logic.on_batch([("b", _RIGHT, "on time")])
+    assert list(out) == [("b", ("new", "on time"))]
+
+    assert logic.conn is not None
+    stored = logic.conn.execute(
+        f"SELECT value FROM join_state_{_partition('a', 1)} WHERE key = 'a'"
+    ).fetchall()
+    assert [pickle.loads(value) for (value,) in stored] == ["late"]
+    recent = logic.conn.execute("SELECT key FROM join_recent").fetchall()
+    assert recent == [("b",)]
+    logic.on_eof()
+
+
+def test_join_partitions_spread_keys_of_a_shard() -> None:
+    """Test that the keys of one shard use every partition."""
+    keys = [f"user_{i}" for i in range(10_000)]
+    shard_keys = [key for key in keys if _shard(key, 16) == "3"]
+    assert len({_partition(key, 16) for key in shard_keys}) == _JOIN_PARTITIONS
+
+
+def test_window_aggregate(tmp_path: Path) -> None:
+    """Test that window_aggregate emits each window once it closes."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    events = [
+        (key, {"ts": start + timedelta(seconds=s), "amount": amount})
+        for key, s, amount in [
+            ("a", 1, 1.0),
+            ("a", 30, 2.0),
+            ("b", 5, 16.0),
+            ("a", 61, 4.0),
+            ("a", 200, 8.0),
+            # Arrives after its window closed.
+            ("a", 2, 32.0),
+        ]
+    ]
+    flow = Dataflow("window")
+    inp = op.input("inp", flow, TestingSource(events, batch_size=1))
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    windows = duck_op.window_aggregate(
+        "window",
+        inp,
+        str(tmp_path / "state"),
+        time_column="ts",
+        length=timedelta(minutes=1),
+        aggregates={"n": "count(*)", "total": "sum(amount)"},
+        columns={"ts": "TIMESTAMPTZ", "amount": "DOUBLE"},
+        shards=1,
+    )
+    op.output("out", windows, TestingSink(out))
+    run_main(flow)
+
+    def window(key: str, minute: int, n: int, total: float) -> Tuple[str, Any]:
+        begin = start + timedelta(minutes=minute)
+        return (
+            key,
+            {
+                "window_start": begin,
+                "window_end": begin + timedelta(minutes=1),
+                "n": n,
+                "total": total,
+            },
+        )
+
+    assert out == [
+        window("a", 0, 2, 3.0),
+        window("b", 0, 1, 16.0),
+        window("a", 1, 1, 4.0),
+        window("a", 3, 1, 8.0),
+    ]
+
+
+def test_window_aggregate_checks_values_against_columns(tmp_path: Path) -> None:
+    """Test that values are cast to the given columns or rejected."""
+    logic = _WindowAggregateLogic(
+        str(tmp_path / "state"),
+        1,
+        None,
+        "ts",
+        timedelta(minutes=1),
+        {"total": "sum(amount)"},
+        {"ts": "TIMESTAMPTZ", "amount": "BIGINT", "ratio": "DOUBLE"},
+        _EPOCH,
+        timedelta(0),
+        10,
+        "window",
+    )
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Integers widen to floats, and missing columns are NULL.
+    logic.on_batch([("a", {"ts": start, "amount": 1, "ratio": 1})])
+    logic.on_batch([("a", {"ts": start, "amount": 2.0})])
+    for amount in (2.75, "3", 2**63):
+        with pytest.raises(ValueError):
+            logic.on_batch([("a", {"ts": start, "amount": amount})])
+    out, _discard = logic.on_eof()
+    assert [result["total"] for _key, result in out] == [3]
@@ -10,6 +10,9 @@ Classes:
                 MotherDuck database and manages partition setup.
     DuckDBSinkPartition: A stateful partition that handles the actual data
                          writing to the DuckDB or MotherDuck tables.
+    DuckDBSpoolPartition: A partition that spools batches to Arrow IPC
+                          files for the writer partition to merge, when
+                          the sink is sharded over several processes.
 
 Usage:
     - Use the `DuckDBSink` class to configure the connection to the target
@@ -68,9 +71,22 @@ Note: For further examples and usage patterns, refer to the
 [Bytewax DuckDB documentation](https://github.com/bytewax/bytewax-duckdb).
 """
 
+import itertools
+import json
+import logging
+import math
 import os
+import queue
+import re
+import shutil
 import sys
-from typing import List, Optional
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
 from urllib.parse import parse_qsl, urlparse
 
 if "BYTEWAX_LICENSE" not in os.environ:
@@ -85,15 +101,150 @@ if "BYTEWAX_LICENSE" not in os.environ:
     print(msg, file=sys.stderr)
 
 import pyarrow as pa  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+from prometheus_client import Counter
 
 import duckdb as md_duckdb
+from bytewax.duckdb import registry, spool
+from bytewax.duckdb.batching import BatchTuner
+from bytewax.duckdb.dedup import ExpiringBloomFilter
+from bytewax.duckdb.ndjson import JSON_ERRORS, NDJSONParser
+from bytewax.duckdb.summary import Summary
 from bytewax.operators import V
 from bytewax.outputs import FixedPartitionedSink, StatefulSinkPartition
 
 MOTHERDUCK_SCHEME = "md"
 
+# DuckDB's default number of rows per row group.
+_ROW_GROUP_SIZE = 122_880
 
-class DuckDBSinkPartition(StatefulSinkPartition[V, None]):
+# Rows removed per retention `DELETE`. Each chunk is its own short
+# transaction taken between inserts, so it never holds up the dataflow
+# for long.
+_RETENTION_CHUNK_ROWS = 10_000
+
+# Tables are rewritten when they span this many times more row groups
+# than their row count needs.
+_COMPACT_FRAGMENTATION = 2.0
+
+_PUBLISH_FORMATS = ("duckdb", "parquet")
+
+# Name of the published database file inside each version directory.
+_PUBLISH_DB_FILE = "database.duckdb"
+
+# Bucket table name suffix format, matching pattern and span per
+# rollover interval.
+_ROLLOVER_INTERVALS = {
+    "day": ("%Y_%m_%d", r"\d{4}_\d{2}_\d{2}", timedelta(days=1)),
+    "hour": ("%Y_%m_%d_%H", r"\d{4}_\d{2}_\d{2}_\d{2}", timedelta(hours=1)),
+}
+
+# Stands in for the bucket name in the DDL buckets are created with.
+_BUCKET_PLACEHOLDER = "__bytewax_bucket__"
+
+# Partition that owns the database file. With `shards`, every other
+# partition spools to it.
+_WRITER_PART = "partition_0"
+
+# In tiered mode, the dataflow thread flushes synchronously once this
+# many times `flush_rows` are staged, so a slow file cannot make the
+# in-memory buffer grow without bound.
+_TIERED_BACKPRESSURE = 4
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: network hiccups against MotherDuck, transient
+# I/O failures and optimistic concurrency conflicts between pooled
+# connections. Anything else (bad SQL, type mismatches, constraint
+# violations) will fail again on retry, so it is raised immediately.
+_TRANSIENT_ERRORS = (
+    md_duckdb.ConnectionException,
+    md_duckdb.HTTPException,
+    md_duckdb.IOException,
+    md_duckdb.TransactionException,
+)
+
+# Errors caused by the data itself: failed casts, out of range values
+# and constraint violations. These are the only errors for which
+# bisecting a batch can isolate the offending rows.
+_DATA_ERRORS = (md_duckdb.DataError, md_duckdb.IntegrityError)
+_ARROW_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError)
+
+_ON_ERROR_MODES = ("raise", "bisect")
+
+# Smallest chunk of a batch converted to Arrow by one conversion worker.
+_CONVERT_CHUNK_ROWS = 16_384
+
+# This is a global var, since the Prometheus REGISTRY is also global.
+ROWS_REJECTED_COUNTER = Counter(
+    "bytewax_duckdb_rows_rejected",
+    "Rows rejected by the DuckDB sink and written to the dead-letter target.",
+    ["step_id", "table"],
+)
+ROWS_DEDUPLICATED_COUNTER = Counter(
+    "bytewax_duckdb_rows_deduplicated",
+    "Duplicate rows dropped by the DuckDB sink before insert.",
+    ["step_id", "table"],
+)
+ROWS_EXPIRED_COUNTER = Counter(
+    "bytewax_duckdb_rows_expired",
+    "Rows deleted by the DuckDB sink's retention policy.",
+    ["step_id", "table"],
+)
+ROWS_SPILLED_COUNTER = Counter(
+    "bytewax_duckdb_rows_spilled",
+    "Rows written to the DuckDB sink's spill instead of the target table.",
+    ["step_id", "table"],
+)
+
+
+def _reject_json(row: Any) -> str:
+    """Serialize a rejected row; raw JSON objects become JSON strings."""
+    if isinstance(row, bytes):
+        row = row.decode(errors="replace")
+    return json.dumps(row, default=str)
+
+
+def _rows_to_arrow(names: List[str], rows: List[Any]) -> pa.Table:
+    """Convert rows like `pa.Table.from_pylist`, with the columns given."""
+    return pa.Table.from_pydict(
+        {name: [row.get(name) for row in rows] for name in names}
+    )
+
+
+@contextmanager
+def _transaction(conn: md_duckdb.DuckDBPyConnection) -> Iterator[None]:
+    """Run the enclosed statements in one transaction."""
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _swap_latest(publish_path: str, version: str) -> None:
+    """Atomically point `latest` at a published version.
+
+    `LATEST` is a text file holding the version directory name, replaced
+    with `os.replace`. Where symlinks are available, `latest` is also a
+    symlink to the version directory, swapped the same way.
+    """
+    pointer = os.path.join(publish_path, "LATEST")
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+
+    link = os.path.join(publish_path, "latest")
+    try:
+        os.symlink(version, f"{link}.tmp", target_is_directory=True)
+        os.replace(f"{link}.tmp", link)
+    except OSError:
+        logger.debug("Could not update the `latest` symlink in %s", publish_path)
+
+
+class DuckDBSinkPartition(StatefulSinkPartition[V, Optional[Dict[str, Any]]]):
     """Stateful sink partition for writing data to either local DuckDB or MotherDuck."""
 
     def __init__(
@@ -101,7 +252,46 @@ class DuckDBSinkPartition(StatefulSinkPartition[V, None]):
         db_path: str,
         table_name: str,
         create_table_sql: Optional[str],
-        resume_state: None,
+        resume_state: Optional[Dict[str, Any]],
+        pool_size: int = 1,
+        ordered: bool = True,
+        max_retries: int = 0,
+        retry_backoff: timedelta = timedelta(milliseconds=100),
+        on_error: str = "raise",
+        dead_letter_table: Optional[str] = None,
+        dead_letter_path: Optional[str] = None,
+        dedup_keys: Optional[List[str]] = None,
+        dedup_capacity: int = 1_000_000,
+        dedup_error_rate: float = 0.001,
+        dedup_ttl: timedelta = timedelta(hours=1),
+        dedup_time_column: Optional[str] = None,
+        sort_by: Optional[List[str]] = None,
+        retention_column: Optional[str] = None,
+        retention_ttl: Optional[timedelta] = None,
+        compact_interval: Optional[timedelta] = None,
+        maintenance_interval: timedelta = timedelta(minutes=1),
+        tiered: bool = False,
+        flush_rows: int = 1_000_000,
+        flush_interval: timedelta = timedelta(seconds=10),
+        summaries: Optional[List[Summary]] = None,
+        publish_path: Optional[str] = None,
+        publish_interval: timedelta = timedelta(minutes=5),
+        publish_format: str = "duckdb",
+        publish_keep: int = 3,
+        spool_path: Optional[str] = None,
+        merge_interval: timedelta = timedelta(seconds=1),
+        batch_tuner: Optional[BatchTuner] = None,
+        rollover_column: Optional[str] = None,
+        rollover_interval: str = "day",
+        profile_path: Optional[str] = None,
+        profile_every: int = 100,
+        profile_keep: int = 100,
+        spill_path: Optional[str] = None,
+        spill_latency: timedelta = timedelta(seconds=1),
+        spill_max_bytes: int = 1 << 30,
+        convert_workers: int = 0,
+        json_columns: Optional[Dict[str, str]] = None,
+        step_id: str = "",
     ) -> None:
         """Initialize the DuckDB or MotherDuck connection, and create tables if needed.
 
@@ -116,8 +306,229 @@ class DuckDBSinkPartition(StatefulSinkPartition[V, None]):
             table_name (str): Name of the table to write data into.
             create_table_sql (Optional[str]): SQL statement to create the table if
                 the table does not already exist.
-            resume_state (None): Unused, as this sink does not perform recovery.
+            resume_state (Optional[Dict[str, Any]]): State returned by a
+                previous `snapshot`. Only the deduplication filter is
+                recovered; rows themselves are committed on every write.
+            pool_size (int): Number of connections used to insert
+                batches concurrently. With the default of `1` batches
+                are inserted one at a time on the dataflow thread. Larger
+                pools mostly pay off against MotherDuck, where each insert
+                is bound by a network round trip.
+            ordered (bool): Up to `pool_size` inserts are kept in flight
+                across calls, and only `snapshot` and `close` wait for
+                them. When `True`, each insert commits only after the
+                insert of the previous batch has, so batches become
+                visible in the order they were written, and are rolled
+                back if an earlier insert failed. When `False`, they
+                commit as soon as they finish.
+            max_retries (int): Number of times an insert failing with a
+                transient error (connection, HTTP, I/O or transaction
+                conflict) is retried before the error is raised.
+            retry_backoff (timedelta): Delay before the first retry; it
+                doubles on every subsequent attempt.
+            on_error (str): What to do when a batch fails because of its
+                data (a failed cast or a constraint violation). `"raise"`
+                fails the dataflow. `"bisect"` splits the batch in halves
+                until the offending rows are isolated, inserts the rest
+                and sends the rejected rows to the dead-letter target.
+            dead_letter_table (Optional[str]): Table receiving rejected
+                rows in `"bisect"` mode. Defaults to
+                `{table_name}_rejected`, created if it does not exist.
+            dead_letter_path (Optional[str]): Directory to write rejected
+                rows to as Parquet files instead of a table.
+            dedup_keys (Optional[List[str]]): Columns identifying a row.
+                When set, rows whose key was already written within
+                `dedup_ttl` are dropped before insert. Keys are tracked
+                in an `ExpiringBloomFilter`; its possible false positives
+                are confirmed against the target table, so only real
+                duplicates are dropped. Without `dedup_time_column`, each
+                confirmation scans the whole table, which on a large
+                table costs far more than the insert itself.
+            dedup_capacity (int): Keys per filter time bucket.
+            dedup_error_rate (float): Target false positive rate of the
+                filter. Lower rates use more memory but require fewer
+                confirmation queries.
+            dedup_ttl (timedelta): How long keys are remembered.
+            dedup_time_column (Optional[str]): Timestamp column, roughly
+                increasing in insert order, that bounds confirmations to
+                rows no older than `dedup_ttl`. Row groups outside that
+                range are skipped by their zonemaps, so the cost follows
+                the rows written within the TTL instead of the table.
+                Duplicates of rows with an older timestamp are kept.
+            sort_by (Optional[List[str]]): Columns to sort each batch by,
+                in ascending order, before inserting it. Rows arriving
+                sorted give each row group narrow min/max zonemaps, which
+                lets range filters on these columns skip most of the
+                table. A batch fills one row group at the default
+                `batch_size` of `duck_op.output`.
+            retention_column (Optional[str]): Timestamp column used to
+                expire rows. Must be given together with `retention_ttl`.
+            retention_ttl (Optional[timedelta]): Rows whose
+                `retention_column` is older than this are deleted in
+                small chunks between inserts.
+            compact_interval (Optional[timedelta]): How often to
+                checkpoint the database, reclaiming space left by
+                deletes, and rewrite the table if its rows are spread
+                over many more row groups than needed. The rewrite
+                pauses inserts while it runs.
+            maintenance_interval (timedelta): How often the background
+                maintenance thread wakes up to apply retention and
+                check whether compaction is due.
+            tiered (bool): Stage batches in an in-memory DuckDB table
+                and move them to the database file in large chunks from
+                a background thread. Commits on the dataflow thread then
+                skip the WAL and storage work of the file. `snapshot`
+                and `close` flush everything staged, so durability
+                points line up with epochs. Constraints of the target
+                table are only checked when rows are flushed. Only
+                supported for local database files, and not together
+                with `pool_size`.
+            flush_rows (int): In tiered mode, number of staged rows that
+                triggers a background flush.
+            flush_interval (timedelta): In tiered mode, maximum time
+                between background flushes.
+            summaries (Optional[List[Summary]]): Aggregate tables to
+                maintain. Each batch is aggregated and merged into them
+                in the same transaction as its raw insert, or as its
+                flush in tiered mode. Retention deletes do not change
+                summaries. Pooled inserts are serialized while summaries
+                are configured, since concurrent merges into the same
+                group would conflict.
+            publish_path (Optional[str]): Directory to publish read-only
+                snapshots of the database to, so it can be queried while
+                the sink holds the file. Every `publish_interval` the
+                database is checkpointed and copied, in one consistent
+                transaction and without pausing inserts, to a new
+                timestamped version directory. Then `LATEST` (and a
+                `latest` symlink where supported) is atomically switched
+                to it. In tiered mode, only flushed rows are published.
+            publish_interval (timedelta): Time between publications.
+            publish_format (str): `"duckdb"` to publish a database file
+                named `database.duckdb`, or `"parquet"` to publish an
+                `EXPORT DATABASE` directory of Parquet files.
+            publish_keep (int): Number of published versions to keep.
+            spool_path (Optional[str]): Spool directory written by
+                `DuckDBSpoolPartition`s in other processes. When set, a
+                background thread inserts sealed spool files into the
+                target table every `merge_interval`, going through
+                deduplication, `sort_by`, dead-lettering, summaries and
+                tiered staging like any other batch, and deletes each
+                file once its rows are committed. A crash between the
+                commit and the delete merges that file again on restart.
+            merge_interval (timedelta): Time between spool merges.
+            batch_tuner (Optional[BatchTuner]): Tuner to report the
+                latency of every insert to, for adaptive batching.
+            rollover_column (Optional[str]): Event time column to split
+                the table into time buckets by. Each row goes to a table
+                named `{table_name}_{YYYY_MM_DD}` (or `..._{HH}` for
+                hourly buckets), created as it first appears from the
+                table that `create_table_sql` creates, which is kept as
+                `{table_name}_template`. `table_name` becomes a
+                `UNION ALL BY NAME` view over the template and every
+                bucket. Buckets are in UTC; timestamps without a time
+                zone are taken to be UTC. With `retention_ttl`,
+                retention drops whole buckets once their end is older
+                than the TTL, instead of deleting rows.
+            rollover_interval (str): `"day"` or `"hour"`.
+            profile_path (Optional[str]): Directory to write DuckDB's
+                JSON query profiles of sampled inserts to. Every
+                `profile_every`-th insert into the target table (every
+                flush in tiered mode) runs with profiling enabled. Its
+                per-operator timings and cardinalities are saved
+                together with the step, partition, table and row count,
+                one JSON file per insert.
+            profile_every (int): Profile one out of this many inserts.
+            profile_keep (int): Number of profile files to keep; the
+                oldest are deleted first.
+            spill_path (Optional[str]): Directory for a local
+                write-ahead spill. Once an insert takes longer than
+                `spill_latency`, or every pooled cursor is busy, batches
+                are appended to Arrow IPC segment files under
+                `{spill_path}/{table_name}` instead of blocking the
+                dataflow, and a background thread inserts the segments
+                in order until the spill is empty. Snapshots record the
+                newest segment; on resume, later segments are deleted,
+                since their rows are replayed from upstream. Cannot be
+                combined with `tiered` or `dedup_keys`.
+            spill_latency (timedelta): Insert latency above which
+                batches are spilled.
+            spill_max_bytes (int): Size of the spill at which
+                `write_batch` blocks until the drain frees room.
+            convert_workers (int): Threads converting rows to Arrow.
+                When greater than 0, each batch is split into chunks
+                converted in a thread pool as it arrives, and is only
+                inserted by the next `write_batch` call, `snapshot` or
+                `close`, so it converts while the previous batch is
+                inserted; DuckDB releases the GIL while it inserts.
+                Chunks only convert in parallel with each other on
+                free-threaded Python builds. With deduplication, batches
+                still converting are inserted before any confirmation
+                query, which must see them.
+            json_columns (Optional[Dict[str, str]]): Column name to
+                DuckDB type. When set, items are raw JSON objects as
+                `bytes` or `str` rather than dicts, and every batch is
+                parsed by DuckDB's `read_json` with these columns instead
+                of being converted in Python. Keys missing from an
+                object are NULL and other keys are ignored; malformed
+                objects and values that do not fit their column fail the
+                batch, or are dead-lettered as JSON strings with
+                `on_error="bisect"`.
+            step_id (str): Step ID used to label metrics.
+
+        Raises:
+            ValueError: If `on_error`, `publish_format` or
+                `rollover_interval` is not a known mode, only one of
+                `retention_column` and `retention_ttl` is given (or, in
+                rollover mode, `retention_column` is not the rollover
+                column), `tiered` is combined with MotherDuck,
+                `pool_size` or `spill_path`, or `json_columns` with
+                `dedup_keys`.
         """
+        if on_error not in _ON_ERROR_MODES:
+            msg = f"`on_error` must be one of {_ON_ERROR_MODES}; got {on_error!r}"
+            raise ValueError(msg)
+        if rollover_column is not None:
+            if rollover_interval not in _ROLLOVER_INTERVALS:
+                msg = (
+                    f"`rollover_interval` must be one of "
+                    f"{tuple(_ROLLOVER_INTERVALS)}; got {rollover_interval!r}"
+                )
+                raise ValueError(msg)
+            if retention_column not in (None, rollover_column):
+                msg = "retention in rollover mode drops buckets by `rollover_column`"
+                raise ValueError(msg)
+            if retention_ttl is not None:
+                retention_column = rollover_column
+        if (retention_column is None) != (retention_ttl is None):
+            msg = "`retention_column` and `retention_ttl` must be set together"
+            raise ValueError(msg)
+        if publish_format not in _PUBLISH_FORMATS:
+            msg = (
+                f"`publish_format` must be one of {_PUBLISH_FORMATS}; "
+                f"got {publish_format!r}"
+            )
+            raise ValueError(msg)
+        if profile_every < 1:
+            msg = "`profile_every` must be at least 1"
+            raise ValueError(msg)
+        if tiered and pool_size > 1:
+            msg = "`tiered` cannot be combined with `pool_size` greater than 1"
+            raise ValueError(msg)
+        if tiered and spill_path is not None:
+            # Staging already keeps slow flushes off the dataflow thread.
+            msg = "`tiered` cannot be combined with `spill_path`"
+            raise ValueError(msg)
+        if json_columns is not None and dedup_keys:
+            # Keys would have to be decoded in Python, which raw JSON
+            # ingestion exists to avoid.
+            msg = "`json_columns` cannot be combined with `dedup_keys`"
+            raise ValueError(msg)
+        if spill_path is not None and dedup_keys:
+            # Confirming a duplicate would have to wait for the drain to
+            # insert every spilled row, which spilling exists to avoid.
+            msg = "`spill_path` cannot be combined with `dedup_keys`"
+            raise ValueError(msg)
+
         self.table_name = table_name
         # Ensure db_path is a string
         db_path = str(db_path)  # Convert to string if it's a Path object
@@ -130,33 +541,1293 @@ class DuckDBSinkPartition(StatefulSinkPartition[V, None]):
             if "custom_user_agent" not in config:
                 config["custom_user_agent"] = "bytewax"
 
-        self.conn = md_duckdb.connect(path, config=config)
+        self.tiered = tiered
+        if tiered and parsed_db_path.scheme == MOTHERDUCK_SCHEME:
+            msg = "`tiered` is only supported for local DuckDB files"
+            raise ValueError(msg)
+        # Steps using the same database share its instance, buffer pool
+        # and threads, whether they are tiered or not.
+        self.conn = registry.connect(path, config=config)
+
+        self.profile_path = profile_path
+        self.profile_every = profile_every
+        self.profile_keep = profile_keep
+        self._insert_count = itertools.count(1)
+        if profile_path is not None:
+            os.makedirs(profile_path, exist_ok=True)
 
+        self.rollover_column = rollover_column
+        self._rollover_template = f"{table_name}_template"
+        self._buckets: Set[str] = set()
+        self._bucket_lock = threading.Lock()
+        if rollover_column is not None:
+            self._setup_rollover(create_table_sql, rollover_interval)
         # Only create the table if specified and if it doesn't already exist
-        if create_table_sql:
+        elif create_table_sql:
             self.conn.execute(create_table_sql)
 
+        self.summaries = summaries or []
+        self._summary_lock = threading.Lock()
+        for summary in self.summaries:
+            summary._create(self.conn, table_name)
+
+        self.ordered = ordered
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.on_error = on_error
+        self.dead_letter_path = dead_letter_path
+        self.dead_letter_table = dead_letter_table or f"{table_name}_rejected"
+        if on_error == "bisect" and dead_letter_path is None:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.dead_letter_table} ("
+                "rejected_at TIMESTAMP WITH TIME ZONE, "
+                "target_table VARCHAR, "
+                "error VARCHAR, "
+                "row JSON)"
+            )
+        self.rows_rejected = 0
+        self._rejected_lock = threading.Lock()
+        self._metrics_labels = {"step_id": step_id, "table": table_name}
+
+        self.dedup_keys = dedup_keys
+        self.dedup_ttl = dedup_ttl
+        self.dedup_time_column = dedup_time_column
+        self._dedup: Optional[ExpiringBloomFilter] = None
+        if dedup_keys:
+            self._dedup = ExpiringBloomFilter(
+                dedup_capacity,
+                dedup_error_rate,
+                dedup_ttl,
+                resume_state=(resume_state or {}).get("dedup"),
+            )
+        self.rows_deduplicated = 0
+
+        self.sort_by = sort_by
+        self.batch_tuner = batch_tuner
+
+        self._json_parser: Optional[NDJSONParser] = None
+        self._convert_errors: Tuple[Type[Exception], ...] = _ARROW_ERRORS
+        if json_columns is not None:
+            self._json_parser = NDJSONParser(json_columns)
+            self._convert_errors = JSON_ERRORS
+
+        self.convert_workers = convert_workers
+        self._convert_pool: Optional[ThreadPoolExecutor] = None
+        if convert_workers > 0:
+            self._convert_pool = ThreadPoolExecutor(
+                max_workers=convert_workers,
+                thread_name_prefix="bytewax-duckdb-convert",
+            )
+        # Batches whose conversion was started but that are not inserted
+        # yet, oldest first, with their chunks from `_submit_conversion`.
+        self._converting: List[
+            Tuple[Any, Optional[List[Tuple[List[Any], "Future[pa.Table]"]]]]
+        ] = []
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
+        # Newest pooled insert, and the one the insert running on each
+        # thread must wait for before committing in ordered mode.
+        self._last_insert: Optional[Future] = None
+        self._commit_after = threading.local()
+        if pool_size > 1:
+            # Cursors are independent connections to the same database
+            # instance, each able to run its own transaction.
+            self._cursors: "queue.SimpleQueue[md_duckdb.DuckDBPyConnection]" = (
+                queue.SimpleQueue()
+            )
+            for _ in range(pool_size):
+                self._cursors.put(self._cursor())
+            self._executor = ThreadPoolExecutor(
+                max_workers=pool_size, thread_name_prefix="bytewax-duckdb"
+            )
+        self.pool_size = pool_size
+
+        # Held while inserting, so maintenance only runs between batches.
+        self._write_lock = threading.Lock()
+        self.retention_column = retention_column
+        self.retention_ttl = retention_ttl
+        self.compact_interval = compact_interval
+        self.maintenance_interval = maintenance_interval
+        self.rows_expired = 0
+        self.publish_path = publish_path
+        self.publish_interval = publish_interval
+        self.publish_format = publish_format
+        self.publish_keep = publish_keep
+        # Copies are attached to the shared instance under a name of
+        # this sink's own, so publishes of other sinks can overlap.
+        self._publish_db = f"bytewax_publish_{uuid.uuid4().hex}"
+        self._maintenance_stop = threading.Event()
+        self._maintenance_thread: Optional[threading.Thread] = None
+        if (
+            retention_ttl is not None
+            or compact_interval is not None
+            or publish_path is not None
+        ):
+            # A cursor shares the sink's database instance, so maintenance
+            # never competes with the dataflow for the file lock.
+            self._maintenance_conn = self._cursor()
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop,
+                name="bytewax-duckdb-maintenance",
+                daemon=True,
+            )
+
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        # Staging tables live in an in-memory database attached to the
+        # shared instance under a name of this sink's own. Rows go to
+        # `_staging[_active]`; the other table is the one being flushed,
+        # since one transaction cannot write to both databases.
+        self._staging_db = f"bytewax_staging_{uuid.uuid4().hex}"
+        self._staging = [f"{self._staging_db}.main.staging_{i}" for i in range(2)]
+        self._active = 0
+        self._staged_rows = 0
+        self._flush_lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._flush_stop = threading.Event()
+        # Failure of a background flush or merge, raised on the dataflow
+        # thread by its next call.
+        self._background_error: Optional[Tuple[str, BaseException]] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        if tiered:
+            self.conn.execute(f"ATTACH ':memory:' AS {self._staging_db}")
+            for staging in self._staging:
+                self.conn.execute(
+                    f"CREATE TABLE {staging} AS FROM {table_name} LIMIT 0"
+                )
+            self._flush_conn = self._cursor()
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop,
+                name="bytewax-duckdb-flush",
+                daemon=True,
+            )
+            self._flush_thread.start()
+
+        self.spool_path = spool_path
+        self.merge_interval = merge_interval
+        self.rows_merged = 0
+        self._merge_stop = threading.Event()
+        self._merge_thread: Optional[threading.Thread] = None
+        if spool_path is not None:
+            self._merge_conn = self._cursor()
+            self._merge_thread = threading.Thread(
+                target=self._merge_loop,
+                name="bytewax-duckdb-merge",
+                daemon=True,
+            )
+            self._merge_thread.start()
+
+        self.spill_path = spill_path
+        self.spill_latency = spill_latency
+        self.spill_max_bytes = spill_max_bytes
+        self.rows_spilled = 0
+        # Set while batches go to the spill; cleared by the drain, under
+        # `_write_lock`, once the spill is empty. The drain only inserts
+        # while it is set, so maintenance that drops tables skips then.
+        self._spilling = False
+        self._spill_bytes = 0
+        self._spill_room = threading.Condition()
+        # Name of the newest segment, which snapshots record.
+        self._spill_last: Optional[str] = None
+        self._spill_wanted = threading.Event()
+        self._spill_stop = threading.Event()
+        self._spill_thread: Optional[threading.Thread] = None
+        if spill_path is not None:
+            self._spill_writer = spool.SpoolWriter(spill_path, table_name)
+            segments = []
+            for segment in spool.sealed_files(spill_path, table_name):
+                name = os.path.basename(segment)
+                if resume_state is not None and "spill" in resume_state:
+                    # Rows spilled after the snapshot are replayed from
+                    # upstream, so their segments would insert them twice.
+                    position = resume_state["spill"]
+                    if position is None or name > position:
+                        os.remove(segment)
+                        continue
+                segments.append(segment)
+                self._spill_last = name
+                self._spill_bytes += os.path.getsize(segment)
+            self._spilling = bool(segments)
+            self._spill_conn = self._cursor()
+            self._spill_thread = threading.Thread(
+                target=self._spill_loop,
+                name="bytewax-duckdb-spill",
+                daemon=True,
+            )
+            self._spill_thread.start()
+            if self._spilling:
+                self._spill_wanted.set()
+
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.start()
+
+    def _setup_rollover(
+        self, create_table_sql: Optional[str], rollover_interval: str
+    ) -> None:
+        """Turn `table_name` into a view over existing time buckets."""
+        assert self.rollover_column is not None
+        conn = self.conn
+        self._rollover_format, suffix_pattern, self._rollover_span = (
+            _ROLLOVER_INTERVALS[rollover_interval]
+        )
+        tables = {
+            name: table_type
+            for name, table_type in conn.execute(
+                "SELECT table_name, table_type FROM information_schema.tables "
+                "WHERE table_catalog = current_database() "
+                "AND table_schema = current_schema()"
+            ).fetchall()
+        }
+        if tables.get(self.table_name) != "VIEW":
+            # First run: the table created by `create_table_sql` becomes
+            # the template buckets are created from.
+            if create_table_sql:
+                conn.execute(create_table_sql)
+            if self._rollover_template not in tables:
+                conn.execute(
+                    f"ALTER TABLE {self.table_name} RENAME TO {self._rollover_template}"
+                )
+
+        (ddl,) = conn.execute(
+            "SELECT sql FROM duckdb_tables() "
+            "WHERE database_name = current_database() "
+            "AND schema_name = current_schema() AND table_name = $name",
+            {"name": self._rollover_template},
+        ).fetchall()[0]
+        # Substituted with `str.replace`, since the DDL may contain
+        # braces, for example in `DEFAULT '{}'`.
+        self._bucket_ddl = ddl.replace(
+            f"CREATE TABLE {self._rollover_template}",
+            f"CREATE TABLE IF NOT EXISTS {_BUCKET_PLACEHOLDER}",
+            1,
+        )
+        col_types = {
+            row[0]: row[1]
+            for row in conn.execute(f"DESCRIBE {self._rollover_template}").fetchall()
+        }
+        # Cast like the insert will, since batches may carry strings.
+        col_type = col_types[self.rollover_column]
+        col = f"CAST({self.rollover_column} AS {col_type})"
+        if col_type == "TIMESTAMP WITH TIME ZONE":
+            col = f"timezone('UTC', {col})"
+        self._bucket_sql = f"strftime({col}, '{self._rollover_format}')"
+
+        pattern = re.compile(f"{re.escape(self.table_name)}_({suffix_pattern})")
+        self._buckets = {
+            match.group(1)
+            for match in map(pattern.fullmatch, tables)
+            if match is not None
+        }
+        self._replace_rollover_view(conn)
+
+    def _replace_rollover_view(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        parts = [self._rollover_template] + [
+            f"{self.table_name}_{suffix}" for suffix in sorted(self._buckets)
+        ]
+        conn.execute(
+            f"CREATE OR REPLACE VIEW {self.table_name} AS "
+            + " UNION ALL BY NAME ".join(f"FROM {part}" for part in parts)
+        )
+
+    def _prepare_buckets(
+        self, conn: md_duckdb.DuckDBPyConnection, source: str
+    ) -> List[str]:
+        """Bucket suffixes of the rows in `source`, creating new buckets.
+
+        Must run outside of a transaction, so new buckets are committed
+        even if the insert is rolled back and retried.
+        """
+        if self.rollover_column is None:
+            return []
+        suffixes = [
+            suffix
+            for (suffix,) in conn.execute(
+                f"SELECT DISTINCT {self._bucket_sql} FROM {source}"
+            ).fetchall()
+        ]
+        if None in suffixes:
+            msg = f"`{self.rollover_column}` must not be NULL in rollover mode"
+            raise md_duckdb.ConstraintException(msg)
+        with self._bucket_lock:
+            new = [suffix for suffix in suffixes if suffix not in self._buckets]
+            if new:
+                for suffix in new:
+                    bucket = f"{self.table_name}_{suffix}"
+                    conn.execute(
+                        self._bucket_ddl.replace(_BUCKET_PLACEHOLDER, bucket, 1)
+                    )
+                    logger.info("Created bucket %s", bucket)
+                self._buckets.update(new)
+                self._replace_rollover_view(conn)
+        return suffixes
+
+    def _insert_from(
+        self,
+        conn: md_duckdb.DuckDBPyConnection,
+        source: str,
+        suffixes: List[str],
+        rows: int,
+    ) -> None:
+        """Insert every row of `source` into the target table or buckets.
+
+        Profiles one out of every `profile_every` calls.
+        """
+        statements: List[Tuple[str, Optional[Dict[str, str]]]]
+        if self.rollover_column is None:
+            statements = [
+                (f"INSERT INTO {self.table_name} SELECT * FROM {source}", None)
+            ]
+        else:
+            statements = [
+                (
+                    f"INSERT INTO {self.table_name}_{suffix} SELECT * FROM {source} "
+                    f"WHERE {self._bucket_sql} = $suffix",
+                    {"suffix": suffix},
+                )
+                for suffix in suffixes
+            ]
+
+        if self.profile_path is None or next(self._insert_count) % self.profile_every:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            return
+
+        profiles: List[Any] = []
+        for sql, params in statements:
+            with self._profiled(conn, profiles):
+                conn.execute(sql, params)
+        self._write_profile(profiles, rows)
+
+    @contextmanager
+    def _profiled(
+        self, conn: md_duckdb.DuckDBPyConnection, profiles: List[Any]
+    ) -> Iterator[None]:
+        """Profile the enclosed statement, appending its JSON profile."""
+        assert self.profile_path is not None
+        raw = os.path.join(self.profile_path, f".{uuid.uuid4().hex}.json")
+        conn.execute("SET enable_profiling = 'json'")
+        quoted_raw = raw.replace("'", "''")
+        conn.execute(f"SET profiling_output = '{quoted_raw}'")
+        try:
+            yield
+        finally:
+            conn.execute("PRAGMA disable_profiling")
+            with suppress(FileNotFoundError):
+                with open(raw) as f:
+                    profiles.append(json.load(f))
+                os.remove(raw)
+
+    def _write_profile(self, profiles: List[Any], rows: int) -> None:
+        """Save sampled profiles and drop the oldest beyond `profile_keep`."""
+        assert self.profile_path is not None
+        now = datetime.now(timezone.utc)
+        record = {
+            "profiled_at": now.isoformat(),
+            **self._metrics_labels,
+            "partition": _WRITER_PART,
+            "rows": rows,
+            "profiles": profiles,
+        }
+        name = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.json"
+        path = os.path.join(self.profile_path, name)
+        try:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(f"{path}.tmp", path)
+
+            names = sorted(
+                entry
+                for entry in os.listdir(self.profile_path)
+                if entry.endswith(".json") and not entry.startswith(".")
+            )
+            for old in names[: -self.profile_keep]:
+                with suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.profile_path, old))
+        except OSError as ex:
+            logger.warning("Could not save insert profile to %s: %s", path, ex)
+
+    def _cursor(self) -> md_duckdb.DuckDBPyConnection:
+        """Open another connection to the sink's database instance."""
+        return self.conn.cursor()
+
+    def _insert_once(
+        self,
+        conn: md_duckdb.DuckDBPyConnection,
+        pa_table: pa.Table,
+        staged: bool = True,
+    ) -> None:
+        """Insert an Arrow table into the target table in one transaction.
+
+        In tiered mode rows go to the active staging table, unless
+        `staged` is false.
+        """
+        conn.register("temp_table", pa_table)
+        try:
+            if self.tiered and staged:
+                # Rejects rows without a bucket before they are staged.
+                self._prepare_buckets(conn, "temp_table")
+                staging = self._staging[self._active]
+                conn.execute(f"INSERT INTO {staging} SELECT * FROM temp_table")
+                return
+            suffixes = self._prepare_buckets(conn, "temp_table")
+            rows = pa_table.num_rows
+            previous: Optional[Future] = getattr(self._commit_after, "insert", None)
+            if self.summaries:
+                # Summary merges are serialized anyway, so waiting for
+                # the previous insert first loses no overlap.
+                self._wait_for_commit(previous)
+                with self._summary_lock, _transaction(conn):
+                    self._insert_from(conn, "temp_table", suffixes, rows)
+                    for summary in self.summaries:
+                        summary._merge(conn, "temp_table")
+            elif previous is not None or len(suffixes) > 1:
+                with _transaction(conn):
+                    self._insert_from(conn, "temp_table", suffixes, rows)
+                    self._wait_for_commit(previous)
+            else:
+                self._insert_from(conn, "temp_table", suffixes, rows)
+        finally:
+            conn.unregister("temp_table")
+
+    def _wait_for_commit(self, previous: Optional[Future]) -> None:
+        """Block until the previous pooled insert is done.
+
+        Raises if it failed, which rolls back the enclosing transaction.
+        """
+        if previous is not None and previous.exception() is not None:
+            msg = f"an earlier insert into {self.table_name} failed"
+            raise RuntimeError(msg)
+
+    def _with_retries(self, what: str, fn: Callable[[], Any]) -> None:
+        """Call `fn`, retrying it on transient errors.
+
+        `fn` must be a single transaction, so that retrying it is safe.
+        """
+        attempt = 0
+        while True:
+            try:
+                fn()
+                return
+            except _TRANSIENT_ERRORS as ex:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff.total_seconds() * 2**attempt
+                attempt += 1
+                logger.warning(
+                    "%s %s failed (%s); retry %d of %d in %.3fs",
+                    what,
+                    self.table_name,
+                    ex,
+                    attempt,
+                    self.max_retries,
+                    delay,
+                )
+                time.sleep(delay)
+
+    def _insert(
+        self,
+        conn: md_duckdb.DuckDBPyConnection,
+        pa_table: pa.Table,
+        staged: bool = True,
+    ) -> None:
+        """Insert an Arrow table, retrying on transient errors."""
+        self._with_retries(
+            "Insert into", lambda: self._insert_once(conn, pa_table, staged)
+        )
+
+    def _flush(self) -> None:
+        """Move all staged rows into the target table.
+
+        The active staging table is swapped between batches, then copied
+        to the file in a single transaction while new batches land in the
+        other staging table.
+
+        Staging tables have the target's columns but not its constraints,
+        so constraint violations only surface here. With
+        `on_error="bisect"`, a flush that fails on bad rows is retried by
+        bisecting the staged rows into the target, dead-lettering the
+        rows it rejects. If the flush still fails, its rows are moved
+        back to the active staging table before the error is raised, so
+        the next flush retries them.
+        """
+        with self._flush_lock:
+            with self._write_lock:
+                if self._staged_rows == 0:
+                    return
+                staging = self._staging[self._active]
+                rows = self._staged_rows
+                self._active ^= 1
+                self._staged_rows = 0
+
+            conn = self._flush_conn
+            suffixes = self._prepare_buckets(conn, staging)
+
+            def flush_once() -> None:
+                with _transaction(conn):
+                    self._insert_from(conn, staging, suffixes, rows)
+                    for summary in self.summaries:
+                        summary._merge(conn, staging)
+
+            try:
+                try:
+                    self._with_retries("Flush of", flush_once)
+                except _DATA_ERRORS:
+                    if self.on_error == "raise":
+                        raise
+                    rejects: List[Tuple[Any, Exception]] = []
+                    staged = conn.execute(f"FROM {staging}").arrow()
+                    self._bisect_insert(conn, staged, rejects, staged=False)
+                    if rejects:
+                        self._dead_letter(conn, rejects)
+            except BaseException:
+                with self._write_lock:
+                    active = self._staging[self._active]
+                    conn.execute(f"INSERT INTO {active} SELECT * FROM {staging}")
+                    self._staged_rows += rows
+                conn.execute(f"TRUNCATE {staging}")
+                raise
+            conn.execute(f"TRUNCATE {staging}")
+
+    def _flush_loop(self) -> None:
+        interval = self.flush_interval.total_seconds()
+        while not self._flush_stop.is_set():
+            self._flush_wanted.wait(interval)
+            self._flush_wanted.clear()
+            try:
+                self._flush()
+            except BaseException as ex:
+                self._background_error = ("flush", ex)
+                logger.error("Flush of %s failed: %s", self.table_name, ex)
+                return
+
+    def _merge_spool(self) -> None:
+        """Insert every sealed spool file, then delete it."""
+        assert self.spool_path is not None
+        merged = []
+        for path in spool.sealed_files(self.spool_path):
+            pa_table = spool.read_file(path)
+            with self._write_lock:
+                if self._dedup is not None:
+                    rows = self._deduplicate(pa_table.to_pylist())
+                    pa_table = pa.Table.from_pylist(rows, schema=pa_table.schema)
+                if pa_table.num_rows > 0:
+                    self._staged_rows += pa_table.num_rows
+                    self._write(self._merge_conn, self._sort(pa_table))
+            self.rows_merged += pa_table.num_rows
+            if self.tiered:
+                merged.append(path)
+            else:
+                os.remove(path)
+
+        if merged:
+            # Staged rows are lost on a crash, so tiered mode keeps the
+            # files until their rows are in the database file.
+            self._flush()
+            for path in merged:
+                os.remove(path)
+
+    def _merge_loop(self) -> None:
+        interval = self.merge_interval.total_seconds()
+        while True:
+            try:
+                self._merge_spool()
+            except BaseException as ex:
+                self._background_error = ("merge", ex)
+                logger.error("Spool merge into %s failed: %s", self.table_name, ex)
+                return
+            if self._merge_stop.wait(interval):
+                return
+
+    def _should_spill(self) -> bool:
+        if self.spill_path is None:
+            return False
+        if self._spilling:
+            return True
+        # With every pooled cursor busy, the next insert would block.
+        busy = sum(not fut.done() for fut in self._pending)
+        return self._executor is not None and busy >= self.pool_size
+
+    def _spill(self, pa_table: pa.Table) -> None:
+        """Append a table to the spill as a new segment."""
+        path = self._spill_writer.write(pa_table)
+        self._spilling = True
+        self._spill_last = os.path.basename(path)
+        with self._spill_room:
+            self._spill_bytes += os.path.getsize(path)
+        self.rows_spilled += pa_table.num_rows
+        ROWS_SPILLED_COUNTER.labels(**self._metrics_labels).inc(pa_table.num_rows)
+        self._spill_wanted.set()
+
+    def _drain_spill(self) -> None:
+        """Insert spilled segments, oldest first, until the spill is empty."""
+        assert self.spill_path is not None
+        while True:
+            segments = spool.sealed_files(self.spill_path, self.table_name)
+            if not segments:
+                with self._write_lock:
+                    # Batches are spilled under the lock, so none can be
+                    # added between this check and clearing the flag.
+                    if not spool.sealed_files(self.spill_path, self.table_name):
+                        self._spilling = False
+                        with self._spill_room:
+                            self._spill_room.notify_all()
+                        return
+                continue
+            for segment in segments:
+                pa_table = spool.read_file(segment)
+                if pa_table.num_rows > 0:
+                    # Spilled rows came after every pooled insert so far.
+                    if self.ordered:
+                        self._commit_after.insert = self._last_insert
+                    try:
+                        self._write(self._spill_conn, pa_table)
+                    finally:
+                        self._commit_after.insert = None
+                size = os.path.getsize(segment)
+                os.remove(segment)
+                with self._spill_room:
+                    self._spill_bytes -= size
+                    self._spill_room.notify_all()
+
+    def _spill_loop(self) -> None:
+        while True:
+            self._spill_wanted.wait()
+            self._spill_wanted.clear()
+            if self._spill_stop.is_set():
+                return
+            try:
+                self._drain_spill()
+            except BaseException as ex:
+                self._background_error = ("spill drain", ex)
+                logger.error("Spill drain into %s failed: %s", self.table_name, ex)
+                with self._spill_room:
+                    self._spill_room.notify_all()
+                return
+
+    def _wait_for_spill_room(self) -> None:
+        """Block while the spill is full, so it stays bounded on disk."""
+        with self._spill_room:
+            while (
+                self._spilling
+                and self._spill_bytes >= self.spill_max_bytes
+                and self._background_error is None
+            ):
+                self._spill_room.wait(1.0)
+        self._raise_background_error()
+
+    def _raise_background_error(self) -> None:
+        if self._background_error is not None:
+            what, ex = self._background_error
+            msg = f"background {what} of {self.table_name} failed"
+            raise RuntimeError(msg) from ex
+
+    def _convert(
+        self, rows: Any, rejects: List[Tuple[Any, Exception]]
+    ) -> List[pa.Table]:
+        """Convert rows to Arrow, bisecting around rows that fail to convert."""
+        try:
+            if self._json_parser is not None:
+                return [self._json_parser.parse(rows)]
+            return [pa.Table.from_pylist(rows)]
+        except self._convert_errors as ex:
+            if self.on_error == "raise":
+                raise
+            if len(rows) == 1:
+                rejects.append((rows[0], ex))
+                return []
+            mid = len(rows) // 2
+            return self._convert(rows[:mid], rejects) + self._convert(
+                rows[mid:], rejects
+            )
+
+    def _submit_conversion(
+        self, rows: Any
+    ) -> Optional[List[Tuple[List[Any], "Future[pa.Table]"]]]:
+        """Start converting chunks of rows in the conversion pool."""
+        if self._convert_pool is None or not rows:
+            return None
+        size = max(_CONVERT_CHUNK_ROWS, math.ceil(len(rows) / self.convert_workers))
+        chunks = [rows[i : i + size] for i in range(0, len(rows), size)]
+        if self._json_parser is not None:
+            return [
+                (chunk, self._convert_pool.submit(self._json_parser.parse, chunk))
+                for chunk in chunks
+            ]
+        names = list(rows[0].keys())
+        return [
+            (chunk, self._convert_pool.submit(_rows_to_arrow, names, chunk))
+            for chunk in chunks
+        ]
+
+    def _gather_conversion(
+        self,
+        rows: Any,
+        chunks: Optional[List[Tuple[List[Any], "Future[pa.Table]"]]],
+        rejects: List[Tuple[Any, Exception]],
+    ) -> List[pa.Table]:
+        """Collect the chunks of `_submit_conversion` into one table."""
+        if chunks is None:
+            return self._convert(rows, rejects)
+        tables = []
+        for chunk, fut in chunks:
+            try:
+                tables.append(fut.result())
+            except self._convert_errors:
+                tables.extend(self._convert(chunk, rejects))
+        if len(tables) <= 1:
+            return tables
+        try:
+            # Chunks infer types separately, so an all-null column in
+            # one of them, or ints in one and floats in another, is
+            # promoted like a conversion of the whole batch would.
+            return [pa.concat_tables(tables, promote_options="permissive")]
+        except _ARROW_ERRORS:
+            rejects.clear()
+            return self._convert(rows, rejects)
+
+    def _insert_converted(self, keep: int) -> None:
+        """Insert converted batches, oldest first, until `keep` are left.
+
+        Must be called with `_write_lock` held.
+        """
+        while len(self._converting) > keep:
+            rows, chunks = self._converting.pop(0)
+            rejects: List[Tuple[Any, Exception]] = []
+            pa_tables = self._gather_conversion(rows, chunks, rejects)
+            if rejects:
+                self._dead_letter(self.conn, rejects)
+
+            # Insert data into the target table
+            for pa_table in map(self._sort, pa_tables):
+                if self._should_spill():
+                    self._spill(pa_table)
+                    continue
+                self._staged_rows += pa_table.num_rows
+                if self._executor is None:
+                    self._write(self.conn, pa_table)
+                else:
+                    fut = self._executor.submit(
+                        self._pooled_write,
+                        pa_table,
+                        self._last_insert if self.ordered else None,
+                    )
+                    self._last_insert = fut
+                    self._pending.append(fut)
+                    self._wait_pending(self.pool_size)
+
+    def _bisect_insert(
+        self,
+        conn: md_duckdb.DuckDBPyConnection,
+        pa_table: pa.Table,
+        rejects: List[Tuple[Any, Exception]],
+        staged: bool = True,
+    ) -> None:
+        """Insert an Arrow table, bisecting around rows that fail to insert.
+
+        Slicing an Arrow table is zero-copy, so a batch with `k` bad rows
+        costs about `2 * k * log2(n)` extra inserts.
+        """
+        try:
+            self._insert(conn, pa_table, staged)
+        except _DATA_ERRORS as ex:
+            if self.on_error == "raise":
+                raise
+            if pa_table.num_rows == 1:
+                rejects.extend((row, ex) for row in pa_table.to_pylist())
+                return
+            mid = pa_table.num_rows // 2
+            self._bisect_insert(conn, pa_table.slice(0, mid), rejects, staged)
+            self._bisect_insert(conn, pa_table.slice(mid), rejects, staged)
+
+    def _dead_letter(
+        self,
+        conn: md_duckdb.DuckDBPyConnection,
+        rejects: List[Tuple[Any, Exception]],
+    ) -> None:
+        """Write rejected rows with their error to the dead-letter target."""
+        now = datetime.now(timezone.utc)
+        count = len(rejects)
+        dl_table = pa.table(
+            {
+                "rejected_at": pa.array([now] * count, pa.timestamp("us", tz="UTC")),
+                "target_table": [self.table_name] * count,
+                "error": [str(ex) for _row, ex in rejects],
+                "row": [_reject_json(row) for row, _ex in rejects],
+            }
+        )
+        if self.dead_letter_path is not None:
+            os.makedirs(self.dead_letter_path, exist_ok=True)
+            file_name = f"{self.table_name}-{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex}"
+            pq.write_table(
+                dl_table, os.path.join(self.dead_letter_path, f"{file_name}.parquet")
+            )
+        else:
+            conn.register("rejected_rows", dl_table)
+            try:
+                conn.execute(
+                    f"INSERT INTO {self.dead_letter_table} SELECT * FROM rejected_rows"
+                )
+            finally:
+                conn.unregister("rejected_rows")
+
+        with self._rejected_lock:
+            self.rows_rejected += count
+        ROWS_REJECTED_COUNTER.labels(**self._metrics_labels).inc(count)
+        logger.warning(
+            "Rejected %d rows for %s; first error: %s",
+            count,
+            self.table_name,
+            rejects[0][1],
+        )
+
+    def _write(self, conn: md_duckdb.DuckDBPyConnection, pa_table: pa.Table) -> None:
+        start = time.perf_counter()
+        rejects: List[Tuple[Any, Exception]] = []
+        self._bisect_insert(conn, pa_table, rejects)
+        if rejects:
+            self._dead_letter(conn, rejects)
+        elapsed = time.perf_counter() - start
+        if self.batch_tuner is not None:
+            self.batch_tuner.observe_insert(pa_table.num_rows, elapsed)
+        if self.spill_path is not None and elapsed > self.spill_latency.total_seconds():
+            self._spilling = True
+
+    def _pooled_write(self, pa_table: pa.Table, previous: Optional[Future]) -> None:
+        conn = self._cursors.get()
+        self._commit_after.insert = previous
+        try:
+            self._write(conn, pa_table)
+        finally:
+            self._commit_after.insert = None
+            self._cursors.put(conn)
+
+    def _wait_pending(self, limit: int) -> None:
+        """Block until at most `limit` pooled inserts are in flight.
+
+        Re-raises the first error of any completed insert.
+        """
+        while len(self._pending) > limit:
+            done, not_done = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._pending = list(not_done)
+            for fut in done:
+                fut.result()
+
+    def _all_rows_sql(self) -> str:
+        """Relation covering written rows, including not yet flushed ones."""
+        if not self.tiered:
+            return self.table_name
+        parts = [self.table_name, *self._staging]
+        return "(" + " UNION ALL BY NAME ".join(f"FROM {t}" for t in parts) + ")"
+
+    def _deduplicate(self, rows: Any) -> List[Any]:
+        """Drop rows whose key was already written within the TTL.
+
+        Rows the filter has definitely not seen are kept right away.
+        Possible hits are checked with a single query against the target
+        table, so a false positive never drops a row. With
+        `dedup_time_column` the query only reads rows within the TTL.
+        """
+        assert self._dedup is not None and self.dedup_keys is not None
+        now = datetime.now(timezone.utc)
+        keep = []
+        uncertain = []
+        seen: Set[Tuple[Any, ...]] = set()
+        for row in rows:
+            key = tuple(row.get(col) for col in self.dedup_keys)
+            if key in seen:
+                continue
+            seen.add(key)
+            if self._dedup.might_contain(key, now):
+                uncertain.append((row, key))
+            else:
+                keep.append(row)
+
+        if uncertain:
+            # Earlier rows still converting or being inserted by the
+            # pool would be missed by the confirmation query.
+            self._insert_converted(0)
+            self._wait_pending(0)
+            candidates = pa.Table.from_pylist(
+                [dict(zip(self.dedup_keys, key)) for _row, key in uncertain]
+            )
+            cols = ", ".join(self.dedup_keys)
+            recent = ""
+            params: Dict[str, Any] = {}
+            if self.dedup_time_column is not None:
+                recent = f" WHERE {self.dedup_time_column} >= $cutoff"
+                params["cutoff"] = now - self.dedup_ttl
+            self.conn.register("dedup_candidates", candidates)
+            try:
+                existing = set(
+                    self.conn.execute(
+                        f"SELECT {cols} FROM dedup_candidates INTERSECT "
+                        f"SELECT {cols} FROM {self._all_rows_sql()}{recent}",
+                        params,
+                    ).fetchall()
+                )
+            finally:
+                self.conn.unregister("dedup_candidates")
+            keep.extend(row for row, key in uncertain if key not in existing)
+
+        for key in seen:
+            self._dedup.add(key, now)
+
+        dropped = len(rows) - len(keep)
+        if dropped:
+            self.rows_deduplicated += dropped
+            ROWS_DEDUPLICATED_COUNTER.labels(**self._metrics_labels).inc(dropped)
+        return keep
+
+    def _drop_buckets(self, cutoff: datetime) -> None:
+        """Drop every bucket that ends before `cutoff`."""
+        conn = self._maintenance_conn
+        naive_cutoff = cutoff.replace(tzinfo=None)
+        for suffix in sorted(self._buckets):
+            start = datetime.strptime(suffix, self._rollover_format)  # noqa: DTZ007
+            if start + self._rollover_span > naive_cutoff:
+                break
+            bucket = f"{self.table_name}_{suffix}"
+            with self._write_lock, self._bucket_lock:
+                if self._spilling:
+                    # The drain may still insert into the bucket.
+                    return
+                (dropped,) = conn.execute(f"SELECT count(*) FROM {bucket}").fetchall()[
+                    0
+                ]
+                self._buckets.discard(suffix)
+                self._replace_rollover_view(conn)
+                conn.execute(f"DROP TABLE {bucket}")
+            logger.info("Dropped expired bucket %s", bucket)
+            self.rows_expired += dropped
+            ROWS_EXPIRED_COUNTER.labels(**self._metrics_labels).inc(dropped)
+
+    def _expire_rows(self) -> None:
+        """Delete rows older than the retention TTL in small chunks."""
+        assert self.retention_ttl is not None
+        cutoff = datetime.now(timezone.utc) - self.retention_ttl
+        if self.rollover_column is not None:
+            self._drop_buckets(cutoff)
+            return
+        while not self._maintenance_stop.is_set():
+            with self._write_lock:
+                (deleted,) = self._maintenance_conn.execute(
+                    f"DELETE FROM {self.table_name} WHERE rowid IN ("
+                    f"SELECT rowid FROM {self.table_name} "
+                    f"WHERE {self.retention_column} < $cutoff "
+                    f"LIMIT {_RETENTION_CHUNK_ROWS})",
+                    {"cutoff": cutoff},
+                ).fetchall()[0]
+            if deleted:
+                self.rows_expired += deleted
+                ROWS_EXPIRED_COUNTER.labels(**self._metrics_labels).inc(deleted)
+            if deleted < _RETENTION_CHUNK_ROWS:
+                break
+
+    def _compact(self) -> None:
+        """Reclaim space and rebuild tables that are fragmented."""
+        conn = self._maintenance_conn
+        with self._write_lock:
+            if self._spilling:
+                # The drain inserts without `_write_lock`, so it would
+                # conflict with tables swapped under it; the next round
+                # compacts once the spill is empty.
+                return
+            # Checkpointing also merges row groups emptied by deletes.
+            conn.execute("CHECKPOINT")
+            if self.rollover_column is None:
+                tables = [self.table_name]
+            else:
+                with self._bucket_lock:
+                    tables = [f"{self.table_name}_{s}" for s in sorted(self._buckets)]
+            rewritten = False
+            for table in tables:
+                rewritten |= self._compact_table(conn, table)
+            if rewritten:
+                conn.execute("CHECKPOINT")
+
+    def _compact_table(self, conn: md_duckdb.DuckDBPyConnection, table: str) -> bool:
+        """Rewrite a table if it is fragmented; returns whether it was."""
+        (row_groups,) = conn.execute(
+            f"SELECT count(DISTINCT row_group_id) FROM pragma_storage_info('{table}')"
+        ).fetchall()[0]
+        (rows,) = conn.execute(f"SELECT count(*) FROM {table}").fetchall()[0]
+        needed = max(1, math.ceil(rows / _ROW_GROUP_SIZE))
+        if row_groups <= _COMPACT_FRAGMENTATION * needed:
+            return False
+
+        logger.info("Rewriting %s: %d rows in %d row groups", table, rows, row_groups)
+        schema, _, name = table.rpartition(".")
+        lookup = (
+            "FROM {} WHERE database_name = current_database() "
+            "AND schema_name = coalesce(nullif($schema, ''), current_schema()) "
+            "AND table_name = $name"
+        )
+        params = {"schema": schema, "name": name}
+        (ddl,) = conn.execute(
+            "SELECT sql " + lookup.format("duckdb_tables()"), params
+        ).fetchall()[0]
+        indexes = conn.execute(
+            "SELECT index_name, sql " + lookup.format("duckdb_indexes()"), params
+        ).fetchall()
+        # Deleting and reinserting in one transaction trips over the
+        # table's own keys, and checkpoints never vacuum an indexed
+        # table, so the rows go to a new copy that replaces the table.
+        prefix = f"{schema}." if schema else ""
+        rebuilt = f"{prefix}{name}_bytewax_compact"
+        order_by = f" ORDER BY {', '.join(self.sort_by)}" if self.sort_by else ""
+        with _transaction(conn):
+            conn.execute(f"CREATE TABLE {rebuilt}(" + ddl.split("(", 1)[1])
+            conn.execute(f"INSERT INTO {rebuilt} SELECT * FROM {table}{order_by}")
+            for index, _sql in indexes:
+                conn.execute(f"DROP INDEX {prefix}{index}")
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {rebuilt} RENAME TO {name}")
+            for _index, sql in indexes:
+                conn.execute(sql)
+        return True
+
+    def _publish(self) -> None:
+        """Publish a consistent read-only copy of the database.
+
+        The copy is written to a hidden directory that is renamed to its
+        version only once complete, so a failed publish never leaves a
+        partial version behind for readers or for pruning.
+        """
+        assert self.publish_path is not None
+        conn = self._maintenance_conn
+        version = datetime.now(timezone.utc).strftime("v%Y%m%dT%H%M%S%fZ")
+        version_dir = os.path.join(self.publish_path, version)
+        partial_dir = os.path.join(self.publish_path, f".{version}.tmp")
+        os.makedirs(partial_dir)
+
+        try:
+            (source,) = conn.execute("SELECT current_database()").fetchall()[0]
+            try:
+                # Only shrinks the WAL the copy has to replay; the copy
+                # itself is consistent either way.
+                with self._write_lock:
+                    conn.execute("CHECKPOINT")
+            except md_duckdb.TransactionException as ex:
+                logger.debug("Skipped checkpoint of %s: %s", self.table_name, ex)
+            if self.publish_format == "duckdb":
+                target = os.path.join(partial_dir, _PUBLISH_DB_FILE).replace("'", "''")
+                conn.execute(f"ATTACH '{target}' AS {self._publish_db}")
+                try:
+                    conn.execute(f"COPY FROM DATABASE {source} TO {self._publish_db}")
+                finally:
+                    conn.execute(f"DETACH {self._publish_db}")
+            else:
+                target = partial_dir.replace("'", "''")
+                conn.execute(f"EXPORT DATABASE {source} TO '{target}' (FORMAT PARQUET)")
+            os.rename(partial_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+
+        _swap_latest(self.publish_path, version)
+        logger.info("Published %s to %s", self.table_name, version_dir)
+
+        versions = []
+        for entry in os.listdir(self.publish_path):
+            path = os.path.join(self.publish_path, entry)
+            if entry.startswith(".v") and entry.endswith(".tmp"):
+                # Left behind by a crash during an earlier publish.
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry.startswith("v") and os.path.isdir(path):
+                versions.append(entry)
+        for old in sorted(versions)[: -self.publish_keep]:
+            shutil.rmtree(os.path.join(self.publish_path, old), ignore_errors=True)
+
+    def _maintenance_loop(self) -> None:
+        interval = self.maintenance_interval.total_seconds()
+        last_compaction = time.monotonic()
+        last_publish = time.monotonic()
+        while not self._maintenance_stop.wait(interval):
+            try:
+                if self.retention_ttl is not None:
+                    self._expire_rows()
+                if (
+                    self.compact_interval is not None
+                    and time.monotonic() - last_compaction
+                    >= self.compact_interval.total_seconds()
+                ):
+                    self._compact()
+                    last_compaction = time.monotonic()
+                if (
+                    self.publish_path is not None
+                    and time.monotonic() - last_publish
+                    >= self.publish_interval.total_seconds()
+                ):
+                    self._publish()
+                    last_publish = time.monotonic()
+            except (md_duckdb.Error, OSError) as ex:
+                # Most likely a conflict with a concurrent insert; the
+                # next round will pick up where this one stopped.
+                logger.warning("Maintenance of %s failed: %s", self.table_name, ex)
+
     def write_batch(self, batches: List[V]) -> None:
         """Write a batch of items to the DuckDB or MotherDuck table.
 
         Args:
             batches (List[V]): List of batches of items to write.
         """
+        self._raise_background_error()
+        if self.spill_path is not None:
+            self._wait_for_spill_room()
+        with self._write_lock:
+            self._write_batches(batches)
+
+        if self.tiered:
+            if self._staged_rows >= _TIERED_BACKPRESSURE * self.flush_rows:
+                self._flush()
+            elif self._staged_rows >= self.flush_rows:
+                self._flush_wanted.set()
+
+    def _sort(self, pa_table: pa.Table) -> pa.Table:
+        if not self.sort_by:
+            return pa_table
+        return pa_table.sort_by([(col, "ascending") for col in self.sort_by])
+
+    def _write_batches(self, batches: List[V]) -> None:
+        # With a conversion pool, the newest batch keeps converting until
+        # the next batch, call or snapshot, while older ones are inserted.
+        ahead = 0 if self._convert_pool is None else 1
         for batch in batches:
-            pa_table = pa.Table.from_pylist(batch)
+            rows: Any = batch
+            if self._dedup is not None:
+                rows = self._deduplicate(rows)
+            if rows:
+                self._converting.append((rows, self._submit_conversion(rows)))
+            self._insert_converted(ahead)
 
-            # Insert data into the target table
-            self.conn.register("temp_table", pa_table)
-            self.conn.execute(f"INSERT INTO {self.table_name} SELECT * FROM temp_table")
-            self.conn.unregister("temp_table")
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Snapshot the deduplication filter and spill position, if any.
+
+        Inserts batches still converting, waits for any in-flight pooled
+        inserts, and in tiered mode flushes every staged row, so that
+        everything written before the snapshot is committed to the
+        database or sealed in the spill.
+        """
+        with self._write_lock:
+            self._insert_converted(0)
+        self._wait_pending(0)
+        if self.tiered:
+            self._raise_background_error()
+            self._flush()
+        state: Dict[str, Any] = {}
+        if self._dedup is not None:
+            state["dedup"] = self._dedup.snapshot()
+        if self.spill_path is not None:
+            state["spill"] = self._spill_last
+        return state or None
+
+    def close(self) -> None:
+        """Close the DuckDB or MotherDuck connection."""
+        try:
+            with self._write_lock:
+                self._insert_converted(0)
+            self._wait_pending(0)
+            if self._spill_thread is not None:
+                self._spill_stop.set()
+                self._spill_wanted.set()
+                self._spill_thread.join()
+                self._raise_background_error()
+                self._drain_spill()
+            if self._merge_thread is not None:
+                self._merge_stop.set()
+                self._merge_thread.join()
+                self._raise_background_error()
+                self._merge_spool()
+            if self._flush_thread is not None:
+                self._flush_stop.set()
+                self._flush_wanted.set()
+                self._flush_thread.join()
+                self._raise_background_error()
+                self._flush()
+        finally:
+            if self._spill_thread is not None:
+                self._spill_conn.close()
+            if self._merge_thread is not None:
+                self._merge_conn.close()
+            if self._flush_thread is not None:
+                self._flush_conn.close()
+            if self._maintenance_thread is not None:
+                self._maintenance_stop.set()
+                self._maintenance_thread.join()
+                if self.publish_path is not None:
+                    try:
+                        self._publish()
+                    except (md_duckdb.Error, OSError) as ex:
+                        logger.warning(
+                            "Final publish of %s failed: %s", self.table_name, ex
+                        )
+                self._maintenance_conn.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                while not self._cursors.empty():
+                    self._cursors.get().close()
+            if self._convert_pool is not None:
+                self._convert_pool.shutdown(wait=True)
+            if self._json_parser is not None:
+                self._json_parser.close()
+            if self.tiered:
+                self.conn.execute(f"DETACH {self._staging_db}")
+            registry.close(self.conn)
+
+
+class DuckDBSpoolPartition(StatefulSinkPartition[V, Optional[Dict[str, Any]]]):
+    """Sink partition that spools batches for the writer partition.
+
+    Used for every partition but the writer's when `DuckDBSink` is
+    sharded, so processes other than the one holding the database file
+    never open it. Batches are converted to Arrow here, in parallel
+    across processes, and written as sealed Arrow IPC files. Rows that
+    fail to convert raise, since there is no database to dead-letter
+    them to.
+    """
+
+    def __init__(
+        self,
+        spool_path: str,
+        shard: str,
+        json_columns: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Init.
+
+        Args:
+            spool_path (str): Spool directory merged by the writer.
+            shard (str): Partition key, naming this shard's directory.
+            json_columns (Optional[Dict[str, str]]): Column types to
+                parse raw JSON items with, as in `DuckDBSinkPartition`.
+        """
+        self._writer = spool.SpoolWriter(spool_path, shard)
+        self._json_parser: Optional[NDJSONParser] = None
+        if json_columns is not None:
+            self._json_parser = NDJSONParser(json_columns)
+
+    def write_batch(self, batches: List[V]) -> None:
+        """Spool each batch to its own file.
+
+        Args:
+            batches (List[V]): List of batches of items to write.
+        """
+        for batch in batches:
+            rows: Any = batch
+            if self._json_parser is not None:
+                self._writer.write(self._json_parser.parse(rows))
+            else:
+                self._writer.write(pa.Table.from_pylist(rows))
 
     def snapshot(self) -> None:
-        """This sink does not support recovery."""
+        """Nothing to snapshot; files are sealed before `write_batch` returns."""
         return None
 
     def close(self) -> None:
-        """Close the DuckDB or MotherDuck connection."""
-        self.conn.close()
+        """Close the JSON parser, if any."""
+        if self._json_parser is not None:
+            self._json_parser.close()
 
 
 class DuckDBSink(FixedPartitionedSink):
@@ -171,6 +1842,45 @@ class DuckDBSink(FixedPartitionedSink):
         db_path: str,
         table_name: str = "default_table",
         create_table_sql: Optional[str] = None,
+        pool_size: int = 1,
+        ordered: bool = True,
+        max_retries: int = 0,
+        retry_backoff: timedelta = timedelta(milliseconds=100),
+        on_error: str = "raise",
+        dead_letter_table: Optional[str] = None,
+        dead_letter_path: Optional[str] = None,
+        dedup_keys: Optional[List[str]] = None,
+        dedup_capacity: int = 1_000_000,
+        dedup_error_rate: float = 0.001,
+        dedup_ttl: timedelta = timedelta(hours=1),
+        dedup_time_column: Optional[str] = None,
+        sort_by: Optional[List[str]] = None,
+        retention_column: Optional[str] = None,
+        retention_ttl: Optional[timedelta] = None,
+        compact_interval: Optional[timedelta] = None,
+        maintenance_interval: timedelta = timedelta(minutes=1),
+        tiered: bool = False,
+        flush_rows: int = 1_000_000,
+        flush_interval: timedelta = timedelta(seconds=10),
+        summaries: Optional[List[Summary]] = None,
+        publish_path: Optional[str] = None,
+        publish_interval: timedelta = timedelta(minutes=5),
+        publish_format: str = "duckdb",
+        publish_keep: int = 3,
+        shards: int = 1,
+        spool_path: Optional[str] = None,
+        merge_interval: timedelta = timedelta(seconds=1),
+        batch_tuner: Optional[BatchTuner] = None,
+        rollover_column: Optional[str] = None,
+        rollover_interval: str = "day",
+        profile_path: Optional[str] = None,
+        profile_every: int = 100,
+        profile_keep: int = 100,
+        spill_path: Optional[str] = None,
+        spill_latency: timedelta = timedelta(seconds=1),
+        spill_max_bytes: int = 1 << 30,
+        convert_workers: int = 0,
+        json_columns: Optional[Dict[str, str]] = None,
     ) -> None:
         """Initialize the DuckDBSink.
 
@@ -179,38 +1889,204 @@ class DuckDBSink(FixedPartitionedSink):
             table_name (str): Name of the table to write data into.
             create_table_sql (Optional[str]): SQL statement to create the table
                 if it does not already exist.
+            pool_size (int): Number of connections per partition used to
+                insert batches concurrently. See `DuckDBSinkPartition`.
+            ordered (bool): Whether pooled inserts commit in the order
+                their batches were written.
+            max_retries (int): Retries for inserts failing with transient
+                errors.
+            retry_backoff (timedelta): Initial delay between retries,
+                doubled on each attempt.
+            on_error (str): `"raise"` to fail on rows that cannot be
+                inserted, or `"bisect"` to isolate them into a
+                dead-letter target and keep going.
+            dead_letter_table (Optional[str]): Table for rejected rows.
+                Defaults to `{table_name}_rejected`.
+            dead_letter_path (Optional[str]): Directory for rejected rows
+                as Parquet files, used instead of a table when set.
+            dedup_keys (Optional[List[str]]): Columns identifying a row,
+                used to drop duplicates before insert.
+            dedup_capacity (int): Keys per deduplication filter bucket.
+            dedup_error_rate (float): False positive rate of the filter.
+            dedup_ttl (timedelta): How long keys are remembered.
+            dedup_time_column (Optional[str]): Timestamp column bounding
+                duplicate confirmations to rows within `dedup_ttl`.
+            sort_by (Optional[List[str]]): Columns to sort each batch by
+                before inserting it, to improve zonemap pruning.
+            retention_column (Optional[str]): Timestamp column used to
+                expire rows.
+            retention_ttl (Optional[timedelta]): Age after which rows
+                are deleted by the sink.
+            compact_interval (Optional[timedelta]): How often to
+                checkpoint and, if fragmented, rewrite the table.
+            maintenance_interval (timedelta): How often background
+                maintenance runs.
+            tiered (bool): Stage batches in memory and flush them to the
+                database file from a background thread.
+            flush_rows (int): Staged rows that trigger a flush.
+            flush_interval (timedelta): Maximum time between flushes.
+            summaries (Optional[List[Summary]]): Aggregate tables kept up
+                to date with every insert.
+            publish_path (Optional[str]): Directory to periodically
+                publish read-only snapshots of the database to.
+            publish_interval (timedelta): Time between publications.
+            publish_format (str): `"duckdb"` or `"parquet"`.
+            publish_keep (int): Number of published versions to keep.
+            shards (int): Number of partitions to write through. DuckDB
+                allows a single writing process per file, so only the
+                writer partition opens it. The other partitions, which
+                bytewax spreads over the cluster's processes, convert
+                their batches to Arrow and spool them to `spool_path`,
+                where the writer merges them. Batches are routed to
+                partitions by key, so use more distinct keys than
+                shards. Only supported for local database files, on a
+                filesystem every process can reach.
+            spool_path (Optional[str]): Spool directory when sharded.
+                Defaults to `{db_path}.spool`.
+            merge_interval (timedelta): How often the writer merges the
+                spool.
+            batch_tuner (Optional[BatchTuner]): Tuner to report insert
+                latencies to, for adaptive batching.
+            rollover_column (Optional[str]): Event time column to route
+                rows to per-day or per-hour bucket tables by, behind a
+                view named `table_name`.
+            rollover_interval (str): `"day"` or `"hour"`.
+            profile_path (Optional[str]): Directory to save JSON query
+                profiles of sampled inserts to.
+            profile_every (int): Profile one out of this many inserts.
+            profile_keep (int): Number of profile files to keep.
+            spill_path (Optional[str]): Directory to spill batches to
+                while inserts are slow, drained in order once the target
+                catches up.
+            spill_latency (timedelta): Insert latency above which
+                batches are spilled.
+            spill_max_bytes (int): Size of the spill at which writes
+                block.
+            convert_workers (int): Threads converting each batch to
+                Arrow while the previous one is inserted.
+            json_columns (Optional[Dict[str, str]]): Column name to
+                DuckDB type, to take items as raw JSON objects parsed by
+                DuckDB's `read_json`.
+
+        Raises:
+            ValueError: If `shards` is combined with MotherDuck.
         """
         self.db_path = db_path
         self.table_name = table_name
         self.create_table_sql = create_table_sql
+        self.pool_size = pool_size
+        self.ordered = ordered
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_error = on_error
+        self.dead_letter_table = dead_letter_table
+        self.dead_letter_path = dead_letter_path
+        self.dedup_keys = dedup_keys
+        self.dedup_capacity = dedup_capacity
+        self.dedup_error_rate = dedup_error_rate
+        self.dedup_ttl = dedup_ttl
+        self.dedup_time_column = dedup_time_column
+        self.sort_by = sort_by
+        self.retention_column = retention_column
+        self.retention_ttl = retention_ttl
+        self.compact_interval = compact_interval
+        self.maintenance_interval = maintenance_interval
+        self.tiered = tiered
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.summaries = summaries
+        self.publish_path = publish_path
+        self.publish_interval = publish_interval
+        self.publish_format = publish_format
+        self.publish_keep = publish_keep
+
+        if shards > 1 and urlparse(str(db_path)).scheme == MOTHERDUCK_SCHEME:
+            msg = "`shards` is only supported for local DuckDB files"
+            raise ValueError(msg)
+        self.shards = shards
+        self.spool_path = spool_path or f"{db_path}.spool"
+        self.merge_interval = merge_interval
+        self.batch_tuner = batch_tuner
+        self.rollover_column = rollover_column
+        self.rollover_interval = rollover_interval
+        self.profile_path = profile_path
+        self.profile_every = profile_every
+        self.profile_keep = profile_keep
+        self.spill_path = spill_path
+        self.spill_latency = spill_latency
+        self.spill_max_bytes = spill_max_bytes
+        self.convert_workers = convert_workers
+        self.json_columns = json_columns
 
     def list_parts(self) -> List[str]:
-        """Returns a single partition to write to.
+        """Returns the writer partition, followed by any spool shards.
 
         Returns:
-            List[str]: List of a single partition key.
+            List[str]: List of partition keys.
         """
-        return ["partition_0"]
+        return [_WRITER_PART] + [f"shard_{i}" for i in range(1, self.shards)]
 
     def build_part(
         self,
         step_id: str,
         for_part: str,
-        resume_state: None,
-    ) -> DuckDBSinkPartition:
+        resume_state: Optional[Dict[str, Any]],
+    ) -> StatefulSinkPartition[V, Optional[Dict[str, Any]]]:
         """Build or resume a partition.
 
         Args:
             step_id (str): The step ID.
             for_part (str): Partition key.
-            resume_state (None): Resume state.
+            resume_state (Optional[Dict[str, Any]]): Resume state.
 
         Returns:
-            DuckDBSinkPartition: The partition instance.
+            StatefulSinkPartition: The writer partition, or a
+                `DuckDBSpoolPartition` for any other shard.
         """
+        if for_part != _WRITER_PART:
+            return DuckDBSpoolPartition(self.spool_path, for_part, self.json_columns)
         return DuckDBSinkPartition(
             db_path=self.db_path,
             table_name=self.table_name,
             create_table_sql=self.create_table_sql,
             resume_state=resume_state,
+            pool_size=self.pool_size,
+            ordered=self.ordered,
+            max_retries=self.max_retries,
+            retry_backoff=self.retry_backoff,
+            on_error=self.on_error,
+            dead_letter_table=self.dead_letter_table,
+            dead_letter_path=self.dead_letter_path,
+            dedup_keys=self.dedup_keys,
+            dedup_capacity=self.dedup_capacity,
+            dedup_error_rate=self.dedup_error_rate,
+            dedup_ttl=self.dedup_ttl,
+            dedup_time_column=self.dedup_time_column,
+            sort_by=self.sort_by,
+            retention_column=self.retention_column,
+            retention_ttl=self.retention_ttl,
+            compact_interval=self.compact_interval,
+            maintenance_interval=self.maintenance_interval,
+            tiered=self.tiered,
+            flush_rows=self.flush_rows,
+            flush_interval=self.flush_interval,
+            summaries=self.summaries,
+            publish_path=self.publish_path,
+            publish_interval=self.publish_interval,
+            publish_format=self.publish_format,
+            publish_keep=self.publish_keep,
+            spool_path=self.spool_path if self.shards > 1 else None,
+            merge_interval=self.merge_interval,
+            batch_tuner=self.batch_tuner,
+            rollover_column=self.rollover_column,
+            rollover_interval=self.rollover_interval,
+            profile_path=self.profile_path,
+            profile_every=self.profile_every,
+            profile_keep=self.profile_keep,
+            spill_path=self.spill_path,
+            spill_latency=self.spill_latency,
+            spill_max_bytes=self.spill_max_bytes,
+            convert_workers=self.convert_workers,
+            json_columns=self.json_columns,
+            step_id=step_id,
         )
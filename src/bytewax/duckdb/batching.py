@@ -0,0 +1,279 @@
+"""Adaptive batching for the DuckDB output operator.
+
+A fixed batch size and timeout suit only one traffic pattern. On a quiet
+stream a large batch waits for its timeout and adds latency to every
+row; on a bursty one it grows until a single insert stalls the dataflow.
+With `AdaptiveBatching`, the batch size and timeout are instead derived
+from two measurements:
+
+* The cost of an insert, modelled as `overhead + per_row * rows` and
+  fitted to the insert latencies the sink reports. The fit decays, so it
+  follows changes in load on the database.
+* The rate at which rows arrive for a key, averaged over the batches
+  recently emitted by any key. Like `op.collect`, collectors discard a
+  key's state once its batch is emitted, so state never grows with the
+  number of keys seen, and a key arriving for the first time is planned
+  with the rate of the keys before it.
+
+To maximize throughput, batches are made just large enough that the
+fixed per-batch overhead is a small share of each insert. With a target
+latency, batches are made as large as possible while the time to fill
+one plus the time to insert it stays under the target.
+
+The sink reports insert latencies to the `BatchTuner` of its own
+process. Collectors in other processes of a cluster keep their initial
+values until the sink's partition runs alongside them.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Generic, List, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from bytewax.operators import StatefulLogic, V
+
+# Weight kept by older insert observations for every new one.
+_DECAY = 0.95
+
+# Weight kept by the previous arrival rate for every emitted batch.
+_RATE_DECAY = 0.9
+
+BATCH_SIZE_GAUGE = Gauge(
+    "bytewax_duckdb_batch_size",
+    "Batch size most recently chosen by adaptive batching.",
+    ["step_id"],
+)
+BATCH_TIMEOUT_GAUGE = Gauge(
+    "bytewax_duckdb_batch_timeout_seconds",
+    "Batch timeout most recently chosen by adaptive batching.",
+    ["step_id"],
+)
+
+
+@dataclass(frozen=True)
+class AdaptiveBatching:
+    """Limits and goal for adaptive batching."""
+
+    min_batch_size: int = 1_000
+    """Smallest batch size to choose."""
+
+    max_batch_size: int = 1_000_000
+    """Largest batch size to choose."""
+
+    min_timeout: timedelta = timedelta(milliseconds=10)
+    """Shortest time to wait for a batch to fill."""
+
+    max_timeout: timedelta = timedelta(seconds=10)
+    """Longest time to wait for a batch to fill."""
+
+    target_latency: Optional[timedelta] = None
+    """End-to-end latency to stay under; `None` maximizes throughput."""
+
+    max_overhead: float = 0.05
+    """Share of insert time the fixed per-batch cost may take up when
+    maximizing throughput."""
+
+    def __post_init__(self) -> None:
+        if not 0 < self.min_batch_size <= self.max_batch_size:
+            msg = "batch size limits must satisfy 0 < min <= max"
+            raise ValueError(msg)
+        if not timedelta(0) < self.min_timeout <= self.max_timeout:
+            msg = "timeout limits must satisfy 0 < min <= max"
+            raise ValueError(msg)
+        if not 0.0 < self.max_overhead < 1.0:
+            msg = "`max_overhead` must be between 0 and 1"
+            raise ValueError(msg)
+
+
+class BatchTuner:
+    """Chooses batch sizes and timeouts from measured insert costs.
+
+    Shared by the collectors and sink partitions of one output step in a
+    process. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        config: AdaptiveBatching,
+        batch_size: int,
+        timeout: timedelta,
+        step_id: str = "",
+    ) -> None:
+        """Init.
+
+        Args:
+            config (AdaptiveBatching): Limits and goal.
+            batch_size (int): Batch size to use until inserts have been
+                measured.
+            timeout (timedelta): Timeout to use until inserts have been
+                measured.
+            step_id (str): Step ID used to label metrics.
+        """
+        self.config = config
+        self._initial = (batch_size, timeout)
+        self._labels = {"step_id": step_id}
+        self._lock = threading.Lock()
+        # Decayed sums for a weighted least squares fit of
+        # `seconds = overhead + per_row * rows`.
+        self._sw = 0.0
+        self._sx = 0.0
+        self._sy = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+        # Overhead of the last fit over batches of different sizes.
+        self._overhead: Optional[float] = None
+        # Decayed rows/second of a key, over the batches keys emitted.
+        self._rate: Optional[float] = None
+
+    def observe_insert(self, rows: int, seconds: float) -> None:
+        """Record the latency of inserting a batch of `rows` rows."""
+        with self._lock:
+            self._sw = self._sw * _DECAY + 1.0
+            self._sx = self._sx * _DECAY + rows
+            self._sy = self._sy * _DECAY + seconds
+            self._sxx = self._sxx * _DECAY + rows * rows
+            self._sxy = self._sxy * _DECAY + rows * seconds
+
+    def observe_batch(self, rows: int, seconds: float) -> None:
+        """Record that a key collected `rows` rows in `seconds`."""
+        if seconds <= 0.0:
+            return
+        with self._lock:
+            rate = rows / seconds
+            if self._rate is not None:
+                rate = _RATE_DECAY * self._rate + (1 - _RATE_DECAY) * rate
+            self._rate = rate
+
+    def key_rate(self) -> Optional[float]:
+        """Rows/second arriving for a key, if any batch was emitted."""
+        with self._lock:
+            return self._rate
+
+    def insert_cost(self) -> Optional[Tuple[float, float]]:
+        """Fitted `(overhead, per_row)` insert cost in seconds, if known.
+
+        While recent batches are all about the same size, the overhead
+        cannot be told apart from the per-row cost, so the last fitted
+        overhead is kept and only the per-row cost follows the recent
+        inserts. Once every batch gets the planned size this is the
+        usual case, and dropping the overhead would shrink the plan to
+        `min_batch_size`.
+        """
+        with self._lock:
+            if self._sw < 2.0 or self._sx <= 0.0:
+                return None
+            mean_x = self._sx / self._sw
+            mean_y = self._sy / self._sw
+            var = self._sxx / self._sw - mean_x * mean_x
+            cov = self._sxy / self._sw - mean_x * mean_y
+            if var <= (0.01 * mean_x) ** 2:
+                if self._overhead is None:
+                    return None
+                overhead = min(self._overhead, mean_y)
+                return (overhead, max((mean_y - overhead) / mean_x, 1e-9))
+            per_row = max(cov / var, 1e-9)
+            self._overhead = max(mean_y - per_row * mean_x, 0.0)
+            return (self._overhead, per_row)
+
+    def plan(self, rate: Optional[float]) -> Tuple[int, timedelta]:
+        """Batch size and timeout for a key receiving `rate` rows/second.
+
+        Args:
+            rate (Optional[float]): Arrival rate of the key, if known.
+
+        Returns:
+            Tuple[int, timedelta]: Batch size and timeout to use.
+        """
+        cfg = self.config
+
+        def clamp_size(size: float) -> int:
+            return min(max(round(size), cfg.min_batch_size), cfg.max_batch_size)
+
+        cost = self.insert_cost()
+        if cost is None:
+            size = clamp_size(self._initial[0])
+            seconds = self._initial[1].total_seconds()
+        elif cfg.target_latency is None:
+            overhead, per_row = cost
+            # `overhead / (overhead + per_row * size) <= max_overhead`
+            size = clamp_size(
+                overhead * (1 - cfg.max_overhead) / (cfg.max_overhead * per_row)
+            )
+            seconds = size / rate if rate else cfg.max_timeout.total_seconds()
+        else:
+            overhead, per_row = cost
+            # Filling takes `size / rate`, inserting takes
+            # `overhead + per_row * size`; both must fit the target.
+            budget = cfg.target_latency.total_seconds() - overhead
+            fill = 1.0 / rate if rate else 0.0
+            size = clamp_size(max(budget, 0.0) / (fill + per_row))
+            seconds = budget - per_row * size
+
+        timeout = min(
+            max(timedelta(seconds=max(seconds, 0.0)), cfg.min_timeout),
+            cfg.max_timeout,
+        )
+        BATCH_SIZE_GAUGE.labels(**self._labels).set(size)
+        BATCH_TIMEOUT_GAUGE.labels(**self._labels).set(timeout.total_seconds())
+        return size, timeout
+
+
+@dataclass
+class _AdaptiveCollectState(Generic[V]):
+    acc: List[V] = field(default_factory=list)
+    max_size: int = 0
+    started_at: Optional[datetime] = None
+    timeout_at: Optional[datetime] = None
+
+
+class _AdaptiveCollectLogic(StatefulLogic[V, List[V], _AdaptiveCollectState[V]]):
+    """Like `op.collect`, but sized by a `BatchTuner`.
+
+    The timeout runs from the first item of a batch rather than the
+    latest, so it bounds how long any row waits. The state is discarded
+    once the batch is emitted.
+    """
+
+    def __init__(self, tuner: BatchTuner, state: _AdaptiveCollectState[V]) -> None:
+        self.tuner = tuner
+        self.state = state
+
+    def _emit(self) -> Tuple[List[List[V]], bool]:
+        state = self.state
+        assert state.started_at is not None
+        elapsed = datetime.now(timezone.utc) - state.started_at
+        self.tuner.observe_batch(len(state.acc), elapsed.total_seconds())
+        return [state.acc], StatefulLogic.DISCARD
+
+    def on_item(self, value: V) -> Tuple[List[List[V]], bool]:
+        state = self.state
+        if state.started_at is None:
+            state.max_size, timeout = self.tuner.plan(self.tuner.key_rate())
+            state.started_at = datetime.now(timezone.utc)
+            state.timeout_at = state.started_at + timeout
+
+        state.acc.append(value)
+        if len(state.acc) >= state.max_size:
+            return self._emit()
+        return [], StatefulLogic.RETAIN
+
+    def on_notify(self) -> Tuple[List[List[V]], bool]:
+        if not self.state.acc:
+            return [], StatefulLogic.DISCARD
+        return self._emit()
+
+    def on_eof(self) -> Tuple[List[List[V]], bool]:
+        return self.on_notify()
+
+    def notify_at(self) -> Optional[datetime]:
+        return self.state.timeout_at
+
+    def snapshot(self) -> _AdaptiveCollectState[V]:
+        return _AdaptiveCollectState(
+            list(self.state.acc),
+            self.state.max_size,
+            self.state.started_at,
+            self.state.timeout_at,
+        )
@@ -0,0 +1,130 @@
+"""Approximate deduplication for the DuckDB sink.
+
+At-least-once upstreams deliver the occasional duplicate. Rather than
+cleaning them up after ingest with `SELECT DISTINCT`, the sink can drop
+them before they are inserted, using a probabilistic membership filter
+on a set of key columns.
+
+The filter is a Bloom filter split into time buckets. New keys are added
+to the newest bucket and lookups check every live bucket. Once the
+oldest bucket has outlived the filter's TTL it is dropped, so memory
+stays bounded by `(buckets + 1) * capacity` keys no matter how long the
+dataflow runs.
+
+A Bloom filter never misses a key it has seen, but can report a key it
+has not seen. The sink therefore treats hits as uncertain and confirms
+them against the target table before dropping the row.
+"""
+
+import hashlib
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _hashes(key: Any) -> Tuple[int, int]:
+    # A stable digest, unlike `hash()`, so filters survive a restart
+    # from a snapshot in another process.
+    data = json.dumps(key, default=str, separators=(",", ":")).encode()
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    return (
+        int.from_bytes(digest[:8], "little"),
+        int.from_bytes(digest[8:], "little") | 1,
+    )
+
+
+class ExpiringBloomFilter:
+    """Time-bucketed Bloom filter whose entries expire after a TTL.
+
+    Keys can be anything serializable to JSON, typically a tuple of
+    column values.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        ttl: timedelta,
+        buckets: int = 4,
+        resume_state: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Init.
+
+        Args:
+            capacity (int): Number of keys each bucket is sized for.
+                Adding more raises the false positive rate above
+                `error_rate`, but never causes false negatives.
+            error_rate (float): Target false positive rate per bucket.
+            ttl (timedelta): How long a key is remembered for. Keys are
+                forgotten between `ttl` and `ttl * (1 + 1 / buckets)`
+                after they were added, depending on where in its bucket
+                they landed.
+            buckets (int): Number of time buckets the TTL is split into.
+            resume_state (Optional[Dict[str, Any]]): State returned by
+                `snapshot` to restore.
+
+        Raises:
+            ValueError: If the arguments cannot produce a valid filter.
+        """
+        if capacity <= 0 or not 0.0 < error_rate < 1.0 or buckets <= 0:
+            msg = (
+                "`capacity` and `buckets` must be positive "
+                "and `error_rate` must be between 0 and 1"
+            )
+            raise ValueError(msg)
+
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.ttl = ttl
+        self.bucket_span = ttl / buckets
+
+        # Newest bucket last.
+        self._buckets: List[Tuple[datetime, bytearray]] = []
+        if resume_state is not None:
+            if resume_state["num_bits"] != self.num_bits:
+                msg = "filter snapshot was taken with a different capacity"
+                raise ValueError(msg)
+            self._buckets = [
+                (start, bytearray(bits)) for start, bits in resume_state["buckets"]
+            ]
+
+    def _positions(self, key: Any) -> List[int]:
+        h1, h2 = _hashes(key)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _expire(self, now: datetime) -> None:
+        # A bucket holds keys added up to `bucket_span` after its start,
+        # so it is kept until the newest of them has reached the TTL.
+        horizon = now - self.ttl - self.bucket_span
+        while self._buckets and self._buckets[0][0] <= horizon:
+            del self._buckets[0]
+
+    def might_contain(self, key: Any, now: Optional[datetime] = None) -> bool:
+        """Whether the key may have been added within the TTL.
+
+        `False` is always correct; `True` may be a false positive.
+        """
+        self._expire(now or datetime.now(timezone.utc))
+        positions = self._positions(key)
+        return any(
+            all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions)
+            for _start, bits in self._buckets
+        )
+
+    def add(self, key: Any, now: Optional[datetime] = None) -> None:
+        """Add a key to the newest bucket."""
+        now = now or datetime.now(timezone.utc)
+        self._expire(now)
+        if not self._buckets or now - self._buckets[-1][0] >= self.bucket_span:
+            self._buckets.append((now, bytearray((self.num_bits + 7) // 8)))
+        bits = self._buckets[-1][1]
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable copy of the filter state."""
+        return {
+            "num_bits": self.num_bits,
+            "buckets": [(start, bytes(bits)) for start, bits in self._buckets],
+        }
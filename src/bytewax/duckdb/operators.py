@@ -56,12 +56,27 @@ con.execute("SELECT * FROM names_cities").fetchdf()
 ```
 """
 
-from datetime import timedelta
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 import bytewax.operators as op
 from bytewax.dataflow import operator
 from bytewax.duckdb import DuckDBSink
+from bytewax.duckdb.batching import (
+    AdaptiveBatching,
+    BatchTuner,
+    _AdaptiveCollectLogic,
+    _AdaptiveCollectState,
+)
+from bytewax.duckdb.state import (
+    _EPOCH,
+    _LEFT,
+    _RIGHT,
+    _JoinLogic,
+    _shard,
+    _WindowAggregateLogic,
+)
+from bytewax.duckdb.summary import Summary
 from bytewax.operators import KeyedStream, V
 
 
@@ -71,9 +86,16 @@ def _to_sink(
     up: KeyedStream[V],
     timeout: timedelta,
     batch_size: int,
+    tuner: Optional[BatchTuner] = None,
 ) -> KeyedStream[List[V]]:
     """Collect batches of items to be inserted into DuckDB."""
-    return op.collect("batch", up, timeout=timeout, max_size=batch_size)
+    if tuner is None:
+        return op.collect("batch", up, timeout=timeout, max_size=batch_size)
+
+    def builder(resume_state: Optional[_AdaptiveCollectState]) -> _AdaptiveCollectLogic:
+        return _AdaptiveCollectLogic(tuner, resume_state or _AdaptiveCollectState())
+
+    return op.stateful("adaptive_batch", up, builder)
 
 
 @operator
@@ -85,6 +107,45 @@ def output(
     create_table_sql: Optional[str],
     timeout: timedelta = timedelta(seconds=1),
     batch_size: int = 122_880,
+    pool_size: int = 1,
+    ordered: bool = True,
+    max_retries: int = 0,
+    retry_backoff: timedelta = timedelta(milliseconds=100),
+    on_error: str = "raise",
+    dead_letter_table: Optional[str] = None,
+    dead_letter_path: Optional[str] = None,
+    dedup_keys: Optional[List[str]] = None,
+    dedup_capacity: int = 1_000_000,
+    dedup_error_rate: float = 0.001,
+    dedup_ttl: timedelta = timedelta(hours=1),
+    dedup_time_column: Optional[str] = None,
+    sort_by: Optional[List[str]] = None,
+    retention_column: Optional[str] = None,
+    retention_ttl: Optional[timedelta] = None,
+    compact_interval: Optional[timedelta] = None,
+    maintenance_interval: timedelta = timedelta(minutes=1),
+    tiered: bool = False,
+    flush_rows: int = 1_000_000,
+    flush_interval: timedelta = timedelta(seconds=10),
+    summaries: Optional[List[Summary]] = None,
+    publish_path: Optional[str] = None,
+    publish_interval: timedelta = timedelta(minutes=5),
+    publish_format: str = "duckdb",
+    publish_keep: int = 3,
+    shards: int = 1,
+    spool_path: Optional[str] = None,
+    merge_interval: timedelta = timedelta(seconds=1),
+    adaptive: Optional[AdaptiveBatching] = None,
+    rollover_column: Optional[str] = None,
+    rollover_interval: str = "day",
+    profile_path: Optional[str] = None,
+    profile_every: int = 100,
+    profile_keep: int = 100,
+    spill_path: Optional[str] = None,
+    spill_latency: timedelta = timedelta(seconds=1),
+    spill_max_bytes: int = 1 << 30,
+    convert_workers: int = 0,
+    json_columns: Optional[Dict[str, str]] = None,
 ) -> None:
     r"""Produce to DuckDB as an output sink.
 
@@ -103,14 +164,399 @@ def output(
     :arg batch_size: the number of items to wait for before writing.
         Defaults to 122_880, an optimal size for DuckDB.
 
+    :arg pool_size: number of connections used to insert batches
+        concurrently. Mostly useful against MotherDuck, where each
+        insert waits on a network round trip. Defaults to 1.
+
+    :arg ordered: when `True`, the up to `pool_size` inserts in
+        flight commit in the order their batches were written. When
+        `False`, each commits as soon as it finishes. Either way,
+        snapshots wait for them. Defaults to `True`.
+
+    :arg max_retries: number of retries for inserts failing with a
+        transient connection, I/O or transaction conflict error.
+        Defaults to 0.
+
+    :arg retry_backoff: delay before the first retry, doubled on each
+        further attempt. Defaults to 100 milliseconds.
+
+    :arg on_error: `"raise"` to fail the dataflow when a batch contains
+        rows that cannot be inserted, or `"bisect"` to split the batch
+        until those rows are isolated, insert the rest and send the
+        rejected rows to a dead-letter target. Defaults to `"raise"`.
+
+    :arg dead_letter_table: table receiving rejected rows with their
+        error text. Defaults to `{table_name}_rejected`.
+
+    :arg dead_letter_path: directory to write rejected rows to as
+        Parquet files instead of a table.
+
+    :arg dedup_keys: columns identifying a row. When set, rows whose
+        key was already written within `dedup_ttl` are dropped before
+        insert, using a time-bucketed Bloom filter whose hits are
+        confirmed against the table. The filter is part of the sink's
+        recovery state. Without `dedup_time_column`, every confirmation
+        scans the whole table.
+
+    :arg dedup_capacity: number of keys each filter time bucket is
+        sized for. Defaults to 1_000_000.
+
+    :arg dedup_error_rate: target false positive rate of the filter.
+        Defaults to 0.001.
+
+    :arg dedup_ttl: how long keys are remembered. Defaults to 1 hour.
+
+    :arg dedup_time_column: timestamp column, roughly increasing as rows
+        are written, that limits confirmations to rows within
+        `dedup_ttl`, so zonemaps skip older row groups. Duplicates of
+        rows with an older timestamp are kept.
+
+    :arg sort_by: columns to sort each batch by before inserting it.
+        Sorted batches give every row group tight min/max zonemaps, so
+        queries filtering on these columns can skip most row groups.
+        Larger batches cluster better; at the default `batch_size` each
+        batch fills exactly one DuckDB row group.
+
+    :arg retention_column: timestamp column used to expire rows. Must
+        be given together with `retention_ttl`.
+
+    :arg retention_ttl: rows whose `retention_column` is older than
+        this are deleted by the sink itself, in small chunks between
+        inserts, on its own connection.
+
+    :arg compact_interval: how often the sink checkpoints the database
+        to reclaim space, rewriting the table first if it is spread
+        over many more row groups than needed. Disabled by default.
+
+    :arg maintenance_interval: how often background maintenance wakes
+        up. Defaults to 1 minute.
+
+    :arg tiered: stage batches in an in-memory DuckDB table and move
+        them to the database file in large chunks from a background
+        thread. Every snapshot and the final close flush all staged
+        rows. Only for local files. Defaults to `False`.
+
+    :arg flush_rows: in tiered mode, staged rows that trigger a flush.
+        Defaults to 1_000_000.
+
+    :arg flush_interval: in tiered mode, maximum time between flushes.
+        Defaults to 10 seconds.
+
+    :arg summaries: aggregate tables, each described by a
+        `bytewax.duckdb.summary.Summary`, updated in the same
+        transaction as every raw insert at a cost proportional to the
+        batch.
+
+    :arg publish_path: directory to publish read-only snapshots of the
+        database to while the dataflow runs. Each snapshot goes to a
+        new version directory, and `LATEST` (plus a `latest` symlink
+        where supported) is switched to it atomically, so analysts can
+        open `latest/database.duckdb` without stopping ingestion.
+
+    :arg publish_interval: time between publications. Defaults to 5
+        minutes.
+
+    :arg publish_format: `"duckdb"` to publish a database file or
+        `"parquet"` to publish an `EXPORT DATABASE` directory. Defaults
+        to `"duckdb"`.
+
+    :arg publish_keep: number of published versions to keep. Defaults
+        to 3.
+
+    :arg shards: number of sink partitions. DuckDB allows one writing
+        process per file, so in a multi-process cluster only the writer
+        partition opens the database. The other partitions convert
+        their batches to Arrow and spool them as Arrow IPC files, which
+        the writer merges into the table. Use more distinct keys than
+        shards so batches spread over all of them. Defaults to 1.
+
+    :arg spool_path: directory shared by all processes for spooled
+        batches. Defaults to `{db_path}.spool`.
+
+    :arg merge_interval: how often the writer merges spooled batches.
+        Defaults to 1 second.
+
+    :arg adaptive: limits and goal for adaptive batching. When set,
+        `batch_size` and `timeout` are only starting values: the batch
+        size and timeout are tuned from measured insert latencies and
+        the rate rows arrive for a key, averaged over recent batches,
+        within the given limits, to reach a target latency or the best
+        throughput. The timeout then runs from the first item of a
+        batch. The chosen values are exported as the
+        `bytewax_duckdb_batch_size` and
+        `bytewax_duckdb_batch_timeout_seconds` gauges.
+
+    :arg rollover_column: event time column to split the table into
+        time buckets by. Rows go to `{table_name}_{YYYY_MM_DD}` tables
+        (with an `_{HH}` suffix for hourly buckets), created from the
+        table `create_table_sql` creates, which is renamed to
+        `{table_name}_template`. `table_name` becomes a view over all
+        buckets. With `retention_ttl`, retention drops whole buckets
+        instead of deleting rows.
+
+    :arg rollover_interval: `"day"` or `"hour"`. Defaults to `"day"`.
+
+    :arg profile_path: directory to save DuckDB JSON query profiles of
+        sampled inserts to, each with the step, partition, table and
+        batch size, to investigate slow inserts after the fact.
+
+    :arg profile_every: profile one out of this many inserts. Defaults
+        to 100.
+
+    :arg profile_keep: number of profile files to keep. Defaults to
+        100.
+
+    :arg spill_path: directory for a local write-ahead spill. While
+        inserts take longer than `spill_latency`, or every pooled
+        connection is busy, batches are appended to Arrow IPC segment
+        files instead of holding up the dataflow, and inserted in order
+        by a background thread once the database catches up. Spilled
+        rows survive a crash; snapshots record the spill position so a
+        resumed dataflow does not insert replayed rows twice. Not
+        supported with `tiered` or `dedup_keys`.
+
+    :arg spill_latency: insert latency above which batches are
+        spilled. Defaults to 1 second.
+
+    :arg spill_max_bytes: spill size at which writes block until the
+        drain catches up. Defaults to 1 GiB.
+
+    :arg convert_workers: number of threads converting rows to Arrow.
+        Each batch is split into chunks converted in the pool as it
+        arrives, and inserted when the next batch arrives or at the next
+        snapshot, so it converts while the previous batch is being
+        inserted. Defaults to 0, converting on the dataflow worker
+        thread.
+
+    :arg json_columns: column name to DuckDB type, like
+        `{"id": "BIGINT", "ts": "TIMESTAMPTZ"}`. When set, the values
+        of `up` are raw JSON objects as `bytes` or `str`, such as Kafka
+        message values, instead of dicts. Each batch is joined into a
+        newline-delimited buffer and parsed by DuckDB's `read_json` with
+        these columns, so no Python dicts are created. Missing keys are
+        NULL. Cannot be combined with `dedup_keys`.
+
     """
+    tuner = None
+    if adaptive is not None:
+        tuner = BatchTuner(adaptive, batch_size, timeout, step_id=step_id)
     return _to_sink(
         "to_sink",
         up,
         timeout=timeout,
         batch_size=batch_size,
+        tuner=tuner,
     ).then(
         op.output,
         "duckdb_output",
-        DuckDBSink(db_path, table_name, create_table_sql),
+        DuckDBSink(
+            db_path,
+            table_name,
+            create_table_sql,
+            pool_size=pool_size,
+            ordered=ordered,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+            on_error=on_error,
+            dead_letter_table=dead_letter_table,
+            dead_letter_path=dead_letter_path,
+            dedup_keys=dedup_keys,
+            dedup_capacity=dedup_capacity,
+            dedup_error_rate=dedup_error_rate,
+            dedup_ttl=dedup_ttl,
+            dedup_time_column=dedup_time_column,
+            sort_by=sort_by,
+            retention_column=retention_column,
+            retention_ttl=retention_ttl,
+            compact_interval=compact_interval,
+            maintenance_interval=maintenance_interval,
+            tiered=tiered,
+            flush_rows=flush_rows,
+            flush_interval=flush_interval,
+            summaries=summaries,
+            publish_path=publish_path,
+            publish_interval=publish_interval,
+            publish_format=publish_format,
+            publish_keep=publish_keep,
+            shards=shards,
+            spool_path=spool_path,
+            merge_interval=merge_interval,
+            batch_tuner=tuner,
+            rollover_column=rollover_column,
+            rollover_interval=rollover_interval,
+            profile_path=profile_path,
+            profile_every=profile_every,
+            profile_keep=profile_keep,
+            spill_path=spill_path,
+            spill_latency=spill_latency,
+            spill_max_bytes=spill_max_bytes,
+            convert_workers=convert_workers,
+            json_columns=json_columns,
+        ),
     )
+
+
+@operator
+def join(
+    step_id: str,
+    left: KeyedStream[Any],
+    right: KeyedStream[Any],
+    state_path: str,
+    shards: int = 16,
+    ttl: Optional[timedelta] = None,
+) -> KeyedStream[Tuple[Any, Any]]:
+    r"""Join two keyed streams, keeping both sides in DuckDB files.
+
+    Every value from one side is paired with every value of the same key
+    that arrived on the other side before it, so each matching pair is
+    emitted once, as `(key, (left_value, right_value))`. Unlike
+    `op.join`, values are kept until they expire, so state grows with
+    the number of values within `ttl` rather than keys. It is kept on
+    disk instead of in memory, split by key so each batch only reads
+    the state of a fraction of the keys, and snapshots only record a
+    position in it.
+
+    ```python
+    orders = op.key_on("order_key", order_events, lambda e: e["user"])
+    clicks = op.key_on("click_key", click_events, lambda e: e["user"])
+    pairs = duck_op.join("orders_clicks", orders, clicks, "state/orders_clicks")
+    ```
+
+    :arg step_id: Unique ID.
+
+    :arg left: Keyed stream of left values. Values must be picklable.
+
+    :arg right: Keyed stream of right values.
+
+    :arg state_path: directory of this step's state files, one DuckDB
+        file per shard. It must not be shared with other steps.
+
+    :arg shards: number of shards keys are hashed onto. Each is a unit
+        of state Bytewax spreads over workers, with its own DuckDB
+        file and query per batch. Must stay the same across resumes.
+        Defaults to 16.
+
+    :arg ttl: how long after arriving, by system time, a value keeps
+        joining with the other side. Expired values are deleted, and
+        stay deleted when resuming from an earlier snapshot. Defaults to
+        `None`, keeping every value forever, so state and the cost of
+        each batch grow without bound.
+
+    :returns: Keyed stream of `(left_value, right_value)` pairs.
+
+    """
+    tagged_left = op.map(
+        "tag_left", left, lambda kv: (_shard(kv[0], shards), (kv[0], _LEFT, kv[1]))
+    )
+    tagged_right = op.map(
+        "tag_right", right, lambda kv: (_shard(kv[0], shards), (kv[0], _RIGHT, kv[1]))
+    )
+    tagged = op.merge("merge", tagged_left, tagged_right)
+
+    def builder(resume_state: Optional[Dict[str, Any]]) -> _JoinLogic:
+        return _JoinLogic(state_path, shards, resume_state, ttl)
+
+    joined = op.stateful_batch("join", tagged, builder)
+    return op.map("unshard", joined, lambda kv: kv[1])
+
+
+@operator
+def window_aggregate(
+    step_id: str,
+    up: KeyedStream[Dict[str, Any]],
+    state_path: str,
+    time_column: str,
+    length: timedelta,
+    aggregates: Dict[str, str],
+    columns: Dict[str, str],
+    align_to: datetime = _EPOCH,
+    allowed_lateness: timedelta = timedelta(0),
+    shards: int = 16,
+    purge_after: int = 10,
+) -> KeyedStream[Dict[str, Any]]:
+    r"""Aggregate tumbling event time windows with SQL, kept in DuckDB files.
+
+    Rows of open windows are stored in DuckDB instead of in memory.
+    When the watermark passes a window's end, its rows are aggregated
+    with `aggregates` in one query and emitted as
+    `(key, {"window_start": ..., "window_end": ..., **aggregates})`,
+    ready to be written with `output`. Like Bytewax's `EventClock`, the
+    watermark is the latest event time seen on a shard minus
+    `allowed_lateness`, advancing with system time while no newer event
+    arrives. Rows whose window has already closed are dropped and
+    counted by the `bytewax_duckdb_window_late_rows` metric. At EOF,
+    every open window is emitted.
+
+    ```python
+    totals = duck_op.window_aggregate(
+        "totals",
+        keyed_orders,
+        "state/totals",
+        time_column="ts",
+        length=timedelta(minutes=5),
+        aggregates={"orders": "count(*)", "revenue": "sum(amount)"},
+        columns={"ts": "TIMESTAMPTZ", "amount": "DECIMAL(18, 2)"},
+    )
+    ```
+
+    :arg step_id: Unique ID.
+
+    :arg up: Keyed stream of dicts holding `columns`. Keys not in
+        `columns` are ignored and missing ones are NULL.
+
+    :arg state_path: directory of this step's state files, one DuckDB
+        file per shard. It must not be shared with other steps.
+
+    :arg time_column: column holding each row's event time, as a
+        `datetime`. Naive datetimes are taken to be UTC.
+
+    :arg length: length of each window.
+
+    :arg aggregates: output field name to SQL aggregate expression over
+        the rows' columns, like `{"revenue": "sum(amount)"}`.
+
+    :arg columns: column name to DuckDB type of the stored rows, like
+        `{"ts": "TIMESTAMPTZ", "amount": "BIGINT"}`, including
+        `time_column`. Values are checked against these types rather
+        than cast: integers widen to floats, but a fraction in an
+        integer column, an out of range integer or a string in a
+        non-text column raises `ValueError`.
+
+    :arg align_to: time at which a window starts. Defaults to the Unix
+        epoch.
+
+    :arg allowed_lateness: how far behind the latest event time rows
+        may arrive before their window closes. Defaults to 0.
+
+    :arg shards: number of shards keys are hashed onto. Must stay the
+        same across resumes. Defaults to 16.
+
+    :arg purge_after: number of snapshots after which the rows of closed
+        windows are deleted from disk. Resuming from an older snapshot
+        would emit those windows again without them. Defaults to 10.
+
+    :returns: Keyed stream of one dict per key and window.
+
+    """
+    if time_column not in columns:
+        msg = f"`time_column` {time_column!r} must be one of `columns`"
+        raise ValueError(msg)
+    sharded = op.map("shard", up, lambda kv: (_shard(kv[0], shards), kv))
+
+    def builder(resume_state: Optional[Dict[str, Any]]) -> _WindowAggregateLogic:
+        return _WindowAggregateLogic(
+            state_path,
+            shards,
+            resume_state,
+            time_column,
+            length,
+            aggregates,
+            columns,
+            align_to,
+            allowed_lateness,
+            purge_after,
+            step_id,
+        )
+
+    windows = op.stateful_batch("window", sharded, builder)
+    return op.map("unshard", windows, lambda kv: kv[1])
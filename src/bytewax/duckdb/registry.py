@@ -0,0 +1,107 @@
+"""Process-wide registry of shared DuckDB database instances.
+
+Every `md_duckdb.connect` call that is not served from an open instance
+starts a full database, with its own buffer pool, memory limit and
+worker threads, and DuckDB lets only one of them write to a file. Steps
+of a dataflow that use the same database should therefore share one
+instance. `connect` keeps one instance per normalized path and
+configuration and hands out cursors to it, which are cheap and can each
+run their own transaction. `close` closes a cursor and, once the last
+cursor of an instance is closed, the instance itself.
+
+```python
+from bytewax.duckdb import registry
+
+conn = registry.connect("events.duckdb")
+try:
+    conn.execute("SELECT count(*) FROM events").fetchall()
+finally:
+    registry.close(conn)
+```
+"""
+
+import itertools
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import duckdb as md_duckdb
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+# Key to the instance's own connection and its number of open cursors.
+_instances: Dict[_Key, Tuple[md_duckdb.DuckDBPyConnection, int]] = {}
+# `id` of every open cursor to the key of its instance.
+_cursors: Dict[int, _Key] = {}
+_anonymous_ids = itertools.count()
+
+
+def _normalize(path: str) -> str:
+    if path in ("", ":memory:"):
+        # Never looked up again, so every call gets its own instance.
+        return f":memory:#anonymous-{next(_anonymous_ids)}"
+    if path.startswith(":memory:") or len(urlparse(path).scheme) > 1:
+        # Named in-memory databases and URLs like `md:` are taken as is.
+        return path
+    return os.path.realpath(os.path.expanduser(path))
+
+
+def connect(
+    path: str, config: Optional[Dict[str, Any]] = None
+) -> md_duckdb.DuckDBPyConnection:
+    """Open a cursor to the shared instance of a database.
+
+    Anonymous in-memory databases (`""` and `":memory:"`) are private
+    by definition, so each call gets a new one.
+
+    Args:
+        path (str): Database file, or any path `md_duckdb.connect`
+            accepts.
+        config (Optional[Dict[str, Any]]): DuckDB configuration. Opening
+            the same file with a different configuration fails, as it
+            does with `md_duckdb.connect`.
+
+    Returns:
+        md_duckdb.DuckDBPyConnection: A cursor, to be closed with
+            `close`.
+    """
+    config = config or {}
+    key = (
+        _normalize(path),
+        tuple(sorted((name, str(value)) for name, value in config.items())),
+    )
+    with _lock:
+        if key in _instances:
+            instance, users = _instances[key]
+        else:
+            instance, users = md_duckdb.connect(path, config=config), 0
+        cursor = instance.cursor()
+        _instances[key] = (instance, users + 1)
+        _cursors[id(cursor)] = key
+    return cursor
+
+
+def close(cursor: md_duckdb.DuckDBPyConnection) -> None:
+    """Close a cursor from `connect`, and its instance if it was the last.
+
+    Closing a cursor twice is a no-op.
+    """
+    with _lock:
+        key = _cursors.pop(id(cursor), None)
+        cursor.close()
+        if key is None:
+            return
+        instance, users = _instances[key]
+        if users > 1:
+            _instances[key] = (instance, users - 1)
+        else:
+            del _instances[key]
+            instance.close()
+
+
+def open_instances() -> int:
+    """Number of database instances currently held by the registry."""
+    with _lock:
+        return len(_instances)
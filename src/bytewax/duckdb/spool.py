@@ -0,0 +1,99 @@
+"""Arrow IPC spool for multi-process writes to one DuckDB file.
+
+DuckDB lets only one process open a database file for writing, so a
+dataflow running on several processes cannot have each of them insert
+into the same file. Instead, every process but the writer converts its
+batches to Arrow and appends them to a spool directory, one Arrow IPC
+file per batch. The writer process merges sealed spool files into the
+target table and deletes them.
+
+Files are written under a temporary name, synced, and renamed once
+complete, so readers only ever see whole files, and a sealed file
+survives a power loss along with its directory entry. Names start
+with a zero-padded write time, so each shard's files merge in the order
+they were written.
+"""
+
+import os
+import time
+import uuid
+from typing import List, Optional
+
+import pyarrow as pa  # type: ignore
+
+_SUFFIX = ".arrow"
+
+
+def _fsync_dir(path: str) -> None:
+    """Persist a directory's entries.
+
+    A no-op where directories cannot be opened, as on Windows.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SpoolWriter:
+    """Appends Arrow tables to one shard's spool directory."""
+
+    def __init__(self, spool_path: str, shard: str) -> None:
+        """Init.
+
+        Args:
+            spool_path (str): Spool directory shared by all processes.
+            shard (str): Name of the shard; each gets a subdirectory.
+        """
+        self.shard_dir = os.path.join(spool_path, shard)
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+    def write(self, pa_table: pa.Table) -> str:
+        """Atomically write a table as a new sealed spool file.
+
+        Returns:
+            str: Path of the sealed file.
+        """
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}{_SUFFIX}"
+        path = os.path.join(self.shard_dir, name)
+        with open(f"{path}.tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, pa_table.schema) as writer:
+                writer.write_table(pa_table)
+            sink.flush()
+            os.fsync(sink.fileno())
+        os.replace(f"{path}.tmp", path)
+        _fsync_dir(self.shard_dir)
+        return path
+
+
+def sealed_files(spool_path: str, shard: Optional[str] = None) -> List[str]:
+    """Paths of every sealed spool file, oldest first within each shard.
+
+    Args:
+        spool_path (str): Spool directory.
+        shard (Optional[str]): Only list this shard's files.
+    """
+    if not os.path.isdir(spool_path):
+        return []
+    paths: List[str] = []
+    shards = sorted(os.listdir(spool_path)) if shard is None else [shard]
+    for shard_name in shards:
+        shard_dir = os.path.join(spool_path, shard_name)
+        if not os.path.isdir(shard_dir):
+            continue
+        paths.extend(
+            os.path.join(shard_dir, name)
+            for name in sorted(os.listdir(shard_dir))
+            if name.endswith(_SUFFIX)
+        )
+    return paths
+
+
+def read_file(path: str) -> pa.Table:
+    """Read a sealed spool file."""
+    with pa.OSFile(path, "rb") as source:
+        return pa.ipc.open_file(source).read_all()
@@ -0,0 +1,495 @@
+"""Keyed join and window state kept in DuckDB files instead of memory.
+
+Bytewax keeps the state of stateful operators in Python objects, one per
+key, and snapshots all of it. For joins and windows over many keys that
+is bounded by the heap. The operators built on this module instead hash
+keys onto a fixed number of shards and keep each shard's state in a
+table of its own DuckDB file under `state_path`, so state is bounded by
+disk, and DuckDB spills to it whatever does not fit its buffer pool.
+
+Items are handled a batch at a time: every activation of a shard inserts
+its items and runs one query for the results, rather than one per item.
+
+Snapshots are cheap, since the state already lives on disk: every state
+row carries the sequence number of the batch that wrote it, and the
+snapshot is only the shard's latest sequence number. On resume, rows
+written after the snapshot are deleted, and windows closed after it are
+opened again, so the replayed items find the state as it was.
+
+The files are opened by whichever process a shard runs on, so
+`state_path` must be on a file system every process of the dataflow can
+reach, unless the cluster always restarts with the same shape.
+"""
+
+import os
+import pickle
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa  # type: ignore
+from prometheus_client import Counter
+
+import duckdb as md_duckdb
+from bytewax.duckdb import _transaction, registry
+from bytewax.operators import StatefulBatchLogic
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Sides of a join, as stored in its state table.
+_LEFT = 0
+_RIGHT = 1
+
+# Tables each shard's join state is split into by key, so a batch only
+# probes the partitions its keys hash to.
+_JOIN_PARTITIONS = 64
+
+# Values appended to a join's `join_recent` table before they are moved
+# to their partitions, so each batch costs one insert rather than one
+# per partition it touches.
+_JOIN_RECENT_ROWS = 100_000
+
+WINDOW_LATE_ROWS_COUNTER = Counter(
+    "bytewax_duckdb_window_late_rows",
+    "Rows dropped by a DuckDB window aggregate because their window had closed.",
+    ["step_id"],
+)
+
+
+def _shard(key: str, shards: int) -> str:
+    """Stable shard of a key; `hash` differs between processes."""
+    return str(zlib.crc32(key.encode()) % shards)
+
+
+def _conform(rows: List[Dict[str, Any]], schema: pa.Schema) -> pa.Table:
+    """Convert rows to `schema`, failing rather than losing information.
+
+    Types are inferred from the values first and then cast safely, so
+    integers widen to floats, but a fractional float in an integer
+    column, or an integer out of its column's range, is an error. Text
+    is never parsed into other types. Missing columns are NULL.
+
+    Raises:
+        ValueError: If a column's values do not fit its type.
+    """
+    try:
+        inferred = pa.Table.from_pylist(rows)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as ex:
+        msg = f"rows cannot be converted: {ex}"
+        raise ValueError(msg) from ex
+    columns = []
+    for field in schema:
+        if field.name not in inferred.column_names:
+            columns.append(pa.nulls(len(rows), field.type))
+            continue
+        column = inferred.column(field.name)
+        if _is_text(column.type) and not _is_text(field.type):
+            msg = f"values of `{field.name}` are text, not {field.type}"
+            raise ValueError(msg)
+        try:
+            columns.append(column.cast(field.type, safe=True))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as ex:
+            msg = f"values of `{field.name}` do not fit its type: {ex}"
+            raise ValueError(msg) from ex
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _is_text(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def _partition(key: str, shards: int) -> int:
+    """Join state partition of a key within its shard.
+
+    Uses the hash bits above the ones `_shard` consumed, since all keys
+    of a shard agree on those.
+    """
+    return zlib.crc32(key.encode()) // shards % _JOIN_PARTITIONS
+
+
+def _to_us(dt: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are taken to be UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+class _ShardLogic(ABC):
+    """Opens a shard's state file and rolls it back on resume."""
+
+    def __init__(
+        self, state_path: str, shards: int, resume_state: Optional[Dict[str, Any]]
+    ) -> None:
+        self.state_path = state_path
+        self.shards = shards
+        self._resume_state = resume_state
+        self.shard: Optional[str] = None
+        self.seq = 0
+        self.conn: Optional[md_duckdb.DuckDBPyConnection] = None
+        if resume_state is not None:
+            self._open(resume_state["shard"])
+
+    def _open_for(self, key: str) -> md_duckdb.DuckDBPyConnection:
+        """Open the state file of the shard a key, and its batch, hash to."""
+        if self.conn is not None:
+            return self.conn
+        return self._open(_shard(key, self.shards))
+
+    def _open(self, shard: str) -> md_duckdb.DuckDBPyConnection:
+        os.makedirs(self.state_path, exist_ok=True)
+        self.shard = shard
+        self.conn = registry.connect(os.path.join(self.state_path, f"{shard}.duckdb"))
+        self._create(self.conn)
+        if self._resume_state is None:
+            # Without a snapshot to resume from, state starts empty like
+            # any other Bytewax state.
+            self._clear(self.conn)
+        else:
+            self.seq = self._resume_state["seq"]
+            self._rollback(self.conn, self.seq)
+        return self.conn
+
+    @abstractmethod
+    def _create(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        """Create the state table if the file does not have it yet."""
+        ...
+
+    @abstractmethod
+    def _clear(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        """Drop all state, when starting without a snapshot."""
+        ...
+
+    @abstractmethod
+    def _rollback(self, conn: md_duckdb.DuckDBPyConnection, seq: int) -> None:
+        """Undo everything written after batch `seq`, when resuming."""
+        ...
+
+    def _close(self) -> None:
+        if self.conn is not None:
+            registry.close(self.conn)
+            self.conn = None
+
+    def on_eof(self) -> Tuple[Iterable[Any], bool]:
+        self._close()
+        return [], StatefulBatchLogic.DISCARD
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"shard": self.shard, "seq": self.seq}
+
+
+class _JoinLogic(
+    _ShardLogic,
+    StatefulBatchLogic[
+        Tuple[str, int, Any], Tuple[str, Tuple[Any, Any]], Dict[str, Any]
+    ],
+):
+    """Inner join of every left value with every right value of a key.
+
+    Both sides are kept, pickled, in the shard's state tables. Each new
+    value is paired with every value of the other side that arrived
+    before it, and no more than `ttl` ago, so each pair is emitted once.
+
+    Batches are appended to `join_recent` with a single insert. Once it
+    holds `_JOIN_RECENT_ROWS` values, they are moved to `join_state_{n}`,
+    one of `_JOIN_PARTITIONS` tables per key hash, dropping expired
+    values on the way. A batch only reads `join_recent` and the
+    partitions of its own keys, so a small batch probes a fraction of
+    the state rather than all of it.
+    """
+
+    def __init__(
+        self,
+        state_path: str,
+        shards: int,
+        resume_state: Optional[Dict[str, Any]],
+        ttl: Optional[timedelta] = None,
+    ) -> None:
+        self.ttl = ttl
+        self._recent_rows = 0
+        super().__init__(state_path, shards, resume_state)
+
+    def _create(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        columns = "key VARCHAR, side TINYINT, seq BIGINT, at_us BIGINT, value BLOB"
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS join_recent ({columns}, part SMALLINT)"
+        )
+        for part in range(_JOIN_PARTITIONS):
+            conn.execute(f"CREATE TABLE IF NOT EXISTS join_state_{part} ({columns})")
+
+    def _tables(self) -> List[str]:
+        return ["join_recent"] + [f"join_state_{n}" for n in range(_JOIN_PARTITIONS)]
+
+    def _clear(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        for table in self._tables():
+            conn.execute(f"DELETE FROM {table}")
+
+    def _rollback(self, conn: md_duckdb.DuckDBPyConnection, seq: int) -> None:
+        for table in self._tables():
+            conn.execute(f"DELETE FROM {table} WHERE seq > $seq", {"seq": seq})
+        (self._recent_rows,) = conn.execute(
+            "SELECT count(*) FROM join_recent"
+        ).fetchall()[0]
+
+    def _settle(self, conn: md_duckdb.DuckDBPyConnection, cutoff_us: int) -> None:
+        """Move recent values to their partitions, deleting expired ones."""
+        with _transaction(conn):
+            for part in range(_JOIN_PARTITIONS):
+                conn.execute(
+                    f"DELETE FROM join_state_{part} WHERE at_us < $cutoff",
+                    {"cutoff": cutoff_us},
+                )
+                conn.execute(
+                    f"INSERT INTO join_state_{part} SELECT * EXCLUDE (part) "
+                    "FROM join_recent WHERE part = $part AND at_us >= $cutoff",
+                    {"part": part, "cutoff": cutoff_us},
+                )
+            conn.execute("DELETE FROM join_recent")
+        self._recent_rows = 0
+
+    def on_batch(
+        self, values: List[Tuple[str, int, Any]]
+    ) -> Tuple[Iterable[Tuple[str, Tuple[Any, Any]]], bool]:
+        conn = self._open_for(values[0][0])
+        now_us = _to_us(datetime.now(timezone.utc))
+        cutoff_us = now_us - self.ttl // _MICROSECOND if self.ttl is not None else 0
+        parts = [_partition(key, self.shards) for key, _side, _value in values]
+        batch = pa.table(
+            {
+                "key": [key for key, _side, _value in values],
+                "side": pa.array([side for _key, side, _value in values], pa.int8()),
+                "seq": range(self.seq + 1, self.seq + 1 + len(values)),
+                "at_us": pa.array([now_us] * len(values), pa.int64()),
+                "value": pa.array(
+                    [pickle.dumps(value) for _key, _side, value in values],
+                    pa.binary(),
+                ),
+                "part": pa.array(parts, pa.int16()),
+            }
+        )
+        self.seq += len(values)
+
+        probed = " UNION ALL ".join(
+            f"SELECT key, side, seq, at_us, value FROM {table}"
+            for table in [
+                "join_recent",
+                *(f"join_state_{part}" for part in sorted(set(parts))),
+            ]
+        )
+        conn.register("join_batch", batch)
+        try:
+            conn.execute("INSERT INTO join_recent SELECT * FROM join_batch")
+            matches = conn.execute(
+                "SELECT b.key, b.side, b.value, s.value "
+                f"FROM join_batch b JOIN ({probed}) s "
+                "ON s.key = b.key AND s.side <> b.side AND s.seq < b.seq "
+                "AND s.at_us >= $cutoff "
+                "ORDER BY b.seq, s.seq",
+                {"cutoff": cutoff_us},
+            ).fetchall()
+        finally:
+            conn.unregister("join_batch")
+        self._recent_rows += len(values)
+        if self._recent_rows >= _JOIN_RECENT_ROWS:
+            self._settle(conn, cutoff_us)
+
+        out = []
+        for key, side, raw, raw_other in matches:
+            value, other = pickle.loads(raw), pickle.loads(raw_other)
+            out.append((key, (value, other) if side == _LEFT else (other, value)))
+        return out, StatefulBatchLogic.RETAIN
+
+
+class _WindowAggregateLogic(
+    _ShardLogic,
+    StatefulBatchLogic[
+        Tuple[str, Dict[str, Any]], Tuple[str, Dict[str, Any]], Dict[str, Any]
+    ],
+):
+    """Tumbling event time windows aggregated with SQL when they close.
+
+    Rows are kept in the shard's `window_state` table, with the given
+    `columns`, their key and window start, until the watermark passes
+    the window's end. As
+    with Bytewax's `EventClock`, the watermark is the latest event time
+    seen minus `allowed_lateness`, advanced by system time since that
+    event was seen. Rows of closed windows are deleted `purge_after`
+    snapshots later, so a resume from an older snapshot would miss them.
+    """
+
+    def __init__(
+        self,
+        state_path: str,
+        shards: int,
+        resume_state: Optional[Dict[str, Any]],
+        time_column: str,
+        length: timedelta,
+        aggregates: Dict[str, str],
+        columns: Dict[str, str],
+        align_to: datetime,
+        allowed_lateness: timedelta,
+        purge_after: int,
+        step_id: str,
+    ) -> None:
+        self.time_column = time_column
+        self.length_us = length // _MICROSECOND
+        self.aggregates = aggregates
+        self.columns = columns
+        self._schema: Optional[pa.Schema] = None
+        self.align_us = _to_us(align_to)
+        self.lateness_us = allowed_lateness // _MICROSECOND
+        self.step_id = step_id
+        self._snapshots: Deque[int] = deque(maxlen=purge_after)
+        self._max_us: Optional[int] = None
+        self._seen_at = datetime.now(timezone.utc)
+        self._next_close_us: Optional[int] = None
+        if resume_state is not None:
+            self._max_us = resume_state["max_event_us"]
+        super().__init__(state_path, shards, resume_state)
+        if self.conn is not None:
+            self._next_close_us = self._earliest_close(self.conn)
+
+    def _create(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        cols = "".join(f', "{name}" {type_}' for name, type_ in self.columns.items())
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS window_state (__key VARCHAR, "
+            f"__window_us BIGINT, __seq BIGINT, __closed_seq BIGINT{cols})"
+        )
+        self._schema = (
+            conn.execute(
+                "SELECT * EXCLUDE (__key, __window_us, __seq, __closed_seq) "
+                "FROM window_state LIMIT 0"
+            )
+            .arrow()
+            .schema
+        )
+
+    def _clear(self, conn: md_duckdb.DuckDBPyConnection) -> None:
+        # Recreated, since `columns` may have changed since the last run.
+        conn.execute("DROP TABLE window_state")
+        self._create(conn)
+
+    def _rollback(self, conn: md_duckdb.DuckDBPyConnection, seq: int) -> None:
+        conn.execute("DELETE FROM window_state WHERE __seq > $seq", {"seq": seq})
+        # Windows closed up to the snapshot were emitted before it.
+        conn.execute(
+            "DELETE FROM window_state WHERE __closed_seq <= $seq", {"seq": seq}
+        )
+        conn.execute(
+            "UPDATE window_state SET __closed_seq = NULL WHERE __closed_seq > $seq",
+            {"seq": seq},
+        )
+
+    def _watermark_us(self) -> Optional[int]:
+        if self._max_us is None:
+            return None
+        drift = (datetime.now(timezone.utc) - self._seen_at) // _MICROSECOND
+        return self._max_us - self.lateness_us + drift
+
+    def _earliest_close(self, conn: md_duckdb.DuckDBPyConnection) -> Optional[int]:
+        return conn.execute(
+            f"SELECT min(__window_us) + {self.length_us} FROM window_state "
+            "WHERE __closed_seq IS NULL"
+        ).fetchall()[0][0]
+
+    def _close_windows(
+        self, watermark_us: Optional[int]
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Aggregate and close every window ending by the watermark, or all."""
+        conn = self.conn
+        if conn is None:
+            return []
+        where = "__closed_seq IS NULL"
+        if watermark_us is not None:
+            where += f" AND __window_us + {self.length_us} <= {watermark_us}"
+        aggs = "".join(
+            f', {expr} AS "{name}"' for name, expr in self.aggregates.items()
+        )
+        rows = conn.execute(
+            f"SELECT __key, __window_us{aggs} FROM window_state WHERE {where} "
+            "GROUP BY __key, __window_us ORDER BY __window_us, __key"
+        ).fetchall()
+        if rows:
+            self.seq += 1
+            conn.execute(
+                f"UPDATE window_state SET __closed_seq = {self.seq} WHERE {where}"
+            )
+        self._next_close_us = self._earliest_close(conn)
+
+        out = []
+        for key, window_us, *values in rows:
+            start = _EPOCH + window_us * _MICROSECOND
+            result = {
+                "window_start": start,
+                "window_end": start + self.length_us * _MICROSECOND,
+            }
+            result.update(zip(self.aggregates, values))
+            out.append((key, result))
+        return out
+
+    def on_batch(
+        self, values: List[Tuple[str, Dict[str, Any]]]
+    ) -> Tuple[Iterable[Tuple[str, Dict[str, Any]]], bool]:
+        conn = self._open_for(values[0][0])
+        assert self._schema is not None
+        batch = _conform([row for _key, row in values], self._schema)
+        self.seq += 1
+        batch = batch.append_column("__key", pa.array([key for key, _row in values]))
+        batch = batch.append_column(
+            "__seq", pa.array([self.seq] * len(values), pa.int64())
+        )
+
+        event_us = f'epoch_us("{self.time_column}")'
+        n, a = self.length_us, self.align_us
+        window_us = f"{event_us} - (({event_us} - {a}) % {n} + {n}) % {n}"
+        conn.register("window_batch", batch)
+        try:
+            late = ""
+            watermark_us = self._watermark_us()
+            if watermark_us is not None:
+                late = f"WHERE {window_us} + {n} > {watermark_us}"
+            (inserted,) = conn.execute(
+                "INSERT INTO window_state BY NAME "
+                f"SELECT *, {window_us} AS __window_us FROM window_batch {late}"
+            ).fetchall()[0]
+            (max_us,) = conn.execute(
+                f"SELECT max({event_us}) FROM window_batch"
+            ).fetchall()[0]
+        finally:
+            conn.unregister("window_batch")
+
+        dropped = len(values) - inserted
+        if dropped:
+            WINDOW_LATE_ROWS_COUNTER.labels(step_id=self.step_id).inc(dropped)
+        if max_us is not None and (self._max_us is None or max_us > self._max_us):
+            self._max_us = max_us
+            self._seen_at = datetime.now(timezone.utc)
+        return self._close_windows(self._watermark_us()), StatefulBatchLogic.RETAIN
+
+    def on_notify(self) -> Tuple[Iterable[Tuple[str, Dict[str, Any]]], bool]:
+        return self._close_windows(self._watermark_us()), StatefulBatchLogic.RETAIN
+
+    def on_eof(self) -> Tuple[Iterable[Tuple[str, Dict[str, Any]]], bool]:
+        out = self._close_windows(None)
+        self._close()
+        return out, StatefulBatchLogic.DISCARD
+
+    def notify_at(self) -> Optional[datetime]:
+        if self._next_close_us is None or self._max_us is None:
+            return None
+        until_close = self._next_close_us - (self._max_us - self.lateness_us)
+        return self._seen_at + until_close * _MICROSECOND
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self.conn is not None:
+            self._snapshots.append(self.seq)
+            if len(self._snapshots) == self._snapshots.maxlen:
+                self.conn.execute(
+                    "DELETE FROM window_state WHERE __closed_seq <= $seq",
+                    {"seq": self._snapshots[0]},
+                )
+        state = super().snapshot()
+        state["max_event_us"] = self._max_us
+        return state
@@ -0,0 +1,198 @@
+"""Incrementally maintained summary tables for the DuckDB sink.
+
+Dashboards usually query aggregates, and recomputing them over every raw
+row on each query gets slower as the table grows. A `Summary` describes
+an aggregate table that the sink keeps up to date itself: each batch is
+aggregated on its own and merged into the summary table in the same
+transaction as the raw insert, so the cost is proportional to the batch
+rather than to the table.
+
+Supported aggregates are `sum`, `count`, `min` and `max`, which merge
+exactly, and `approx_distinct`, a HyperLogLog estimate. HyperLogLog
+registers are kept in a side table named `{table_name}_hll`, since the
+estimate itself cannot be merged; after each merge the estimate column
+of the affected groups is recomputed from those registers.
+
+```python
+from bytewax.duckdb.summary import Summary
+
+Summary(
+    "events_per_day",
+    group_by={"tenant": "tenant", "day": "date_trunc('day', ts)"},
+    aggregates={
+        "events": ("count", "*"),
+        "revenue": ("sum", "amount"),
+        "users": ("approx_distinct", "user_id"),
+    },
+)
+```
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import duckdb as md_duckdb
+
+_MERGE_SQL = {
+    "sum": "coalesce({col} + EXCLUDED.{col}, {col}, EXCLUDED.{col})",
+    "count": "{col} + EXCLUDED.{col}",
+    # `least` and `greatest` skip NULLs in DuckDB.
+    "min": "least({col}, EXCLUDED.{col})",
+    "max": "greatest({col}, EXCLUDED.{col})",
+}
+_FUNCTIONS = (*_MERGE_SQL, "approx_distinct")
+
+
+@dataclass(frozen=True)
+class Summary:
+    """Aggregate table maintained alongside the raw table.
+
+    Group-by values must never be `NULL`, since they form the summary
+    table's primary key.
+    """
+
+    table_name: str
+    """Name of the summary table; created if it does not exist."""
+
+    group_by: Dict[str, str]
+    """Summary column name to SQL expression over the raw columns."""
+
+    aggregates: Dict[str, Tuple[str, str]]
+    """Summary column name to `(function, SQL expression)`.
+
+    `function` is one of `"sum"`, `"count"`, `"min"`, `"max"` or
+    `"approx_distinct"`. Use `("count", "*")` to count rows.
+    """
+
+    hll_precision: int = 10
+    """HyperLogLog precision; `2 ** hll_precision` registers per group.
+
+    The standard error of `approx_distinct` is about
+    `1.04 / sqrt(2 ** hll_precision)`, 3.3% at the default.
+    """
+
+    def __post_init__(self) -> None:
+        if not self.group_by:
+            msg = f"summary {self.table_name!r} needs at least one group-by column"
+            raise ValueError(msg)
+        for name, (func, _expr) in self.aggregates.items():
+            if func not in _FUNCTIONS:
+                msg = (
+                    f"unknown aggregate {func!r} for column {name!r}; "
+                    f"expected one of {_FUNCTIONS}"
+                )
+                raise ValueError(msg)
+        if not 4 <= self.hll_precision <= 16:
+            msg = "`hll_precision` must be between 4 and 16"
+            raise ValueError(msg)
+
+    @property
+    def _keys(self) -> List[str]:
+        return list(self.group_by)
+
+    @property
+    def _hll_table(self) -> str:
+        return f"{self.table_name}_hll"
+
+    def _has_hll(self) -> bool:
+        return any(func == "approx_distinct" for func, _ in self.aggregates.values())
+
+    def _group_select(self) -> str:
+        return ", ".join(f"{expr} AS {name}" for name, expr in self.group_by.items())
+
+    def _aggregate_select(self) -> str:
+        cols = []
+        for name, (func, expr) in self.aggregates.items():
+            if func == "approx_distinct":
+                # Placeholder, filled in from the registers after merging.
+                cols.append(f"0::BIGINT AS {name}")
+            else:
+                cols.append(f"{func}({expr}) AS {name}")
+        return ", ".join(cols)
+
+    def _create(self, conn: md_duckdb.DuckDBPyConnection, raw_table: str) -> None:
+        """Create the summary tables if needed, typed after the raw table."""
+        described = conn.execute(
+            f"DESCRIBE SELECT {self._group_select()}, {self._aggregate_select()} "
+            f"FROM {raw_table} GROUP BY ALL"
+        ).fetchall()
+        types = {row[0]: row[1] for row in described}
+        keys = ", ".join(self._keys)
+        cols = ", ".join(f"{name} {col_type}" for name, col_type in types.items())
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} "
+            f"({cols}, PRIMARY KEY ({keys}))"
+        )
+        if self._has_hll():
+            key_cols = ", ".join(f"{name} {types[name]}" for name in self._keys)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._hll_table} "
+                f"({key_cols}, aggregate VARCHAR, register SMALLINT, "
+                f"rank UTINYINT, PRIMARY KEY ({keys}, aggregate, register))"
+            )
+
+    def _merge(self, conn: md_duckdb.DuckDBPyConnection, source: str) -> None:
+        """Aggregate `source` and merge it into the summary tables.
+
+        Must run inside the transaction that inserts `source` into the
+        raw table.
+        """
+        keys = ", ".join(self._keys)
+        updates = [
+            f"{name} = " + _MERGE_SQL[func].format(col=name)
+            for name, (func, _expr) in self.aggregates.items()
+            if func != "approx_distinct"
+        ]
+        conflict = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        conn.execute(
+            f"INSERT INTO {self.table_name} "
+            f"SELECT {self._group_select()}, {self._aggregate_select()} "
+            f"FROM {source} GROUP BY ALL "
+            f"ON CONFLICT ({keys}) {conflict}"
+        )
+
+        for name, (func, expr) in self.aggregates.items():
+            if func == "approx_distinct":
+                self._merge_hll(conn, source, name, expr)
+
+    def _merge_hll(
+        self, conn: md_duckdb.DuckDBPyConnection, source: str, name: str, expr: str
+    ) -> None:
+        p = self.hll_precision
+        m = 1 << p
+        keys = ", ".join(self._keys)
+        # The first `p` bits of the hash pick the register, the rank is
+        # one more than the number of leading zeros in the rest.
+        conn.execute(
+            f"INSERT INTO {self._hll_table} "
+            f"SELECT {keys}, '{name}', register, max(rank) FROM ("
+            f"  SELECT {self._group_select()}, "
+            f"    (h >> {64 - p})::SMALLINT AS register, "
+            f"    CASE WHEN w = 0 THEN {64 - p + 1} "
+            f"    ELSE {64 - p} - floor(log2(w::DOUBLE))::INTEGER END AS rank "
+            f"  FROM (SELECT *, hash({expr}) AS h, "
+            f"    hash({expr}) & ((1::UBIGINT << {64 - p}) - 1) AS w "
+            f"    FROM {source} WHERE ({expr}) IS NOT NULL)"
+            f") GROUP BY ALL "
+            f"ON CONFLICT ({keys}, aggregate, register) "
+            f"DO UPDATE SET rank = greatest(rank, EXCLUDED.rank)"
+        )
+
+        alpha = 0.7213 / (1 + 1.079 / m)
+        join = " AND ".join(f"s.{key} = e.{key}" for key in self._keys)
+        conn.execute(
+            f"UPDATE {self.table_name} AS s SET {name} = e.estimate FROM ("
+            f"  SELECT {keys}, CASE "
+            f"    WHEN raw <= {2.5 * m} AND zeros > 0 "
+            f"    THEN {m} * ln({m} / zeros) ELSE raw END::BIGINT AS estimate "
+            f"  FROM ("
+            f"    SELECT {keys}, {m} - count(*) AS zeros, "
+            f"      {alpha * m * m} "
+            f"      / (sum(pow(2, -rank::INTEGER)) + {m} - count(*)) AS raw "
+            f"    FROM {self._hll_table} "
+            f"    SEMI JOIN (SELECT DISTINCT {self._group_select()} FROM {source}) "
+            f"    USING ({keys}) "
+            f"    WHERE aggregate = '{name}' GROUP BY ALL"
+            f"  )"
+            f") AS e WHERE {join}"
+        )